@@ -0,0 +1,78 @@
+"""
+Benchmark of the LIF memory block table scan: scan_lif_blocks (memory-mapped,
+one struct.unpack_from per block) against the previous loop of small
+f.read + struct.unpack calls and a seek per block, on a synthetic LIF with
+10,000 memory blocks.
+
+    python benchmarks/bench_lif_block_scan.py [--blocks 10000]
+"""
+import os
+import sys
+import struct
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from leica_fixtures import best_time, make_lif  # noqa: E402
+from omero_biomero.file_browser.ReadLeicaLIF import read_lif_header, scan_lif_blocks  # noqa: E402
+
+
+def read_lif_blocks(f, file_path):
+    # The block table loop scan_lif_blocks replaced
+    blocks = []
+    while True:
+        data = f.read(4)
+        if not data:
+            break
+        if struct.unpack("i", data)[0] != 112:
+            raise ValueError(f"Error Opening LIF-File: {file_path}")
+        struct.unpack("i", f.read(4))
+        if struct.unpack("B", f.read(1))[0] != 42:
+            raise ValueError(f"Error Opening LIF-File: {file_path}")
+        memory_size = struct.unpack("q", f.read(8))[0]
+        if struct.unpack("B", f.read(1))[0] != 42:
+            raise ValueError(f"Error Opening LIF-File: {file_path}")
+        block_id_length = struct.unpack("i", f.read(4))[0]
+        block_id = f.read(block_id_length * 2).decode("utf-16")
+        blocks.append((block_id, memory_size, f.tell()))
+        if memory_size > 0:
+            f.seek(memory_size, os.SEEK_CUR)
+    return blocks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--blocks", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        # One memory block per image plus the root block
+        file_path = make_lif(
+            os.path.join(folder, "blocks.lif"), args.blocks - 1, xs=8, ys=8, zs=1, channels=1
+        )
+        with open(file_path, "rb") as f:
+            offset = 13 + read_lif_header(f, file_path) * 2
+
+        def scan_reads():
+            with open(file_path, "rb") as f:
+                f.seek(offset)
+                return read_lif_blocks(f, file_path)
+
+        def scan_mmap():
+            with open(file_path, "rb") as f:
+                return scan_lif_blocks(f, offset, file_path)
+
+        table = scan_mmap()
+        assert list(zip(table.block_ids, table.sizes, table.positions)) == scan_reads()
+
+        reads = best_time(scan_reads, args.repeat)
+        mapped = best_time(scan_mmap, args.repeat)
+        print(f"{len(table.block_ids)} blocks, {os.path.getsize(file_path) / 1e6:.1f} MB")
+        print(f"  read + unpack per field  {reads * 1000:8.1f} ms")
+        print(f"  mmap + unpack_from       {mapped * 1000:8.1f} ms  ({reads / mapped:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark of parse_image_xml on the images of a synthetic 5,000-image LIF
+header: the single-walk parser against the one it replaced, which is loaded
+from git (--baseline-rev) and must produce identical metadata.
+
+    python benchmarks/bench_parse_image_xml.py [--images 5000] [--baseline-rev 404242a^]
+"""
+import os
+import sys
+import types
+import argparse
+import subprocess
+import xml.etree.ElementTree as ET
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from leica_fixtures import best_time, lif_header_xml  # noqa: E402
+from omero_biomero.file_browser import ParseLeicaImageXML  # noqa: E402
+
+PARSER_PATH = "omero_biomero/file_browser/ParseLeicaImageXML.py"
+
+
+def load_baseline(revision):
+    """
+    The parser module as of revision, or None when git cannot provide it.
+    """
+    try:
+        source = subprocess.run(
+            ["git", "show", f"{revision}:{PARSER_PATH}"],
+            cwd=REPO,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    module = types.ModuleType("baseline_parse_image_xml")
+    exec(compile(source, f"{revision}:{PARSER_PATH}", "exec"), module.__dict__)
+    return module
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", type=int, default=5000)
+    parser.add_argument("--baseline-rev", default="404242a^")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    xml, _ = lif_header_xml(args.images, channels=3)
+    root = ET.fromstring(xml)
+    elements = [element for element in root.iter("Element") if element.find("Data/Image") is not None]
+
+    def parse_all(module, **kwargs):
+        return lambda: [module.parse_image_xml(element, **kwargs) for element in elements]
+
+    runs = [("single walk", parse_all(ParseLeicaImageXML))]
+    for profile in ("preview", "listing"):
+        runs.append((f"single walk, {profile}", parse_all(ParseLeicaImageXML, profile=profile)))
+
+    baseline = load_baseline(args.baseline_rev)
+    if baseline is None:
+        print(f"Parser at {args.baseline_rev} is not available, only timing the current one")
+    else:
+        assert parse_all(baseline)() == parse_all(ParseLeicaImageXML)()
+        runs.insert(0, (f"baseline ({args.baseline_rev})", parse_all(baseline)))
+
+    print(f"{len(elements)} images")
+    reference = None
+    for label, run in runs:
+        seconds = best_time(run, args.repeat)
+        reference = reference or seconds
+        print(f"  {label:<24} {seconds * 1000:8.1f} ms  ({reference / seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
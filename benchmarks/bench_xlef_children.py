@@ -0,0 +1,75 @@
+"""
+Benchmark of listing an XLEF collection with 500 .xlif children, serially
+and with the thread pool of read_leica_xlef_dict(max_workers=...).
+
+Local files hardly show what a network share costs, so every child file
+open can be delayed by a simulated round trip (--latency-ms, slept outside
+the GIL like real I/O). The metadata caches are cleared before every run.
+
+    python benchmarks/bench_xlef_children.py [--children 500] [--latency-ms 0 2 10]
+"""
+import os
+import sys
+import time
+import argparse
+import builtins
+import tempfile
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from leica_fixtures import best_time, make_xlef_collection  # noqa: E402
+from omero_biomero.file_browser import ReadLeicaXLEF  # noqa: E402
+
+
+def clear_caches():
+    with ReadLeicaXLEF._xml_cache_lock:
+        ReadLeicaXLEF._xml_cache.clear()
+        ReadLeicaXLEF._xml_cache_bytes = 0
+        ReadLeicaXLEF._element_metadata_cache.clear()
+
+
+def slow_open(latency):
+    def open_child(file, *args, **kwargs):
+        if str(file).endswith((".xlif", ".xlcf")):
+            time.sleep(latency)
+        return builtins.open(file, *args, **kwargs)
+
+    return open_child
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--children", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, nargs="+", default=[0, 2, 10])
+    parser.add_argument("--workers", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        file_path = make_xlef_collection(folder, args.children)
+        expected = ReadLeicaXLEF.read_leica_xlef_dict(file_path)
+        assert len(expected["children"]) == args.children
+
+        print(f"{args.children} children")
+        for latency_ms in args.latency_ms:
+            with mock.patch.object(ReadLeicaXLEF, "open", slow_open(latency_ms / 1000), create=True):
+                results = []
+                for workers in [None] + args.workers:
+
+                    def listing():
+                        clear_caches()
+                        result = ReadLeicaXLEF.read_leica_xlef_dict(file_path, max_workers=workers)
+                        assert result == expected
+
+                    results.append((workers, best_time(listing, args.repeat)))
+
+            serial = results[0][1]
+            print(f"  {latency_ms:g} ms per file")
+            for workers, seconds in results:
+                label = "serial" if workers is None else f"{workers} workers"
+                print(f"    {label:<11} {seconds * 1000:8.1f} ms  ({serial / seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
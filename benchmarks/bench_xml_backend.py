@@ -0,0 +1,93 @@
+"""
+Benchmark of the XML backends of the Leica readers (see LeicaXMLBackend):
+per-file parse times with ElementTree and with lxml on synthetic LIF
+headers and .xlif files, plus UniqueID lookups in a parsed LIF header.
+
+The backend is chosen when LeicaXMLBackend is imported, so each one is
+measured in its own process (LEICA_XML_BACKEND=etree forces ElementTree).
+
+    python benchmarks/bench_xml_backend.py [--images 5000] [--xlif-files 200]
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from leica_fixtures import best_time, make_lif, make_xlef_collection  # noqa: E402
+
+
+def measure(folder, repeat):
+    # Runs in the child process, with the backend selected by the environment
+    from omero_biomero.file_browser import LeicaXMLBackend as backend
+    from omero_biomero.file_browser.ReadLeicaLIF import build_lif_index, read_lif_header
+
+    lif_path = os.path.join(folder, "header.lif")
+    with open(lif_path, "rb") as f:
+        header = f.read(read_lif_header(f, lif_path) * 2).decode("utf-16")
+    xlif_paths = sorted(
+        os.path.join(folder, "xlef", name)
+        for name in os.listdir(os.path.join(folder, "xlef"))
+        if name.endswith(".xlif")
+    )
+    root = backend.xml_fromstring(header)
+    uuids = [f"image-{i}" for i in range(0, len(root.findall(".//Element[@UniqueID]")) - 1, 250)]
+
+    return {
+        "backend": backend.BACKEND,
+        "LIF header parse": best_time(lambda: backend.xml_fromstring(header), repeat),
+        "LIF build_lif_index": best_time(lambda: build_lif_index(lif_path), repeat),
+        "XLIF parse (per file)": best_time(
+            lambda: [backend.xml_parse(path) for path in xlif_paths], repeat
+        ) / len(xlif_paths),
+        "UUID lookup (per lookup)": best_time(
+            lambda: [backend.find_element_by_uuid(root, uuid) for uuid in uuids], repeat
+        ) / len(uuids),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", type=int, default=5000)
+    parser.add_argument("--xlif-files", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.repeat)))
+        return
+
+    with tempfile.TemporaryDirectory() as folder:
+        make_lif(os.path.join(folder, "header.lif"), args.images, xs=8, ys=8, zs=1, channels=3)
+        make_xlef_collection(os.path.join(folder, "xlef"), args.xlif_files)
+
+        results = []
+        for name in ("etree", "lxml"):
+            env = dict(os.environ, LEICA_XML_BACKEND=name)
+            output = subprocess.run(
+                [sys.executable, __file__, "--measure", folder, "--repeat", str(args.repeat)],
+                env=env,
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            result = json.loads(output)
+            if result["backend"] != name:
+                print(f"{name} is not installed, skipped")
+                continue
+            results.append(result)
+
+    print(f"{args.images} images in the LIF header, {args.xlif_files} .xlif files")
+    print(f"  {'':<26}" + "".join(f"{result['backend']:>12}" for result in results))
+    for key in results[0]:
+        if key == "backend":
+            continue
+        print(f"  {key:<26}" + "".join(f"{result[key] * 1000:>9.3f} ms" for result in results))
+
+
+if __name__ == "__main__":
+    main()
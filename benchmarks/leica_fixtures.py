@@ -0,0 +1,152 @@
+"""
+Synthetic Leica files for the benchmarks: LIF files with any number of
+images/memory blocks, and XLEF collections of .xlif children. The metadata
+follows the layout of real files (channels, dimensions, viewer scaling,
+hardware settings with many detectors, tile scans); pixel data is zeros.
+"""
+import os
+import time
+import struct
+
+LUT_NAMES = ("Red", "Green", "Blue")
+
+
+def image_xml(name, unique_id, block_id, xs=64, ys=48, zs=3, channels=2, tiles=1, detectors=40):
+    """
+    XML of one image Element, as found in a LIF header or an .xlif file.
+    """
+    channel_xml = "".join(
+        f'<ChannelDescription DataType="0" ChannelTag="0" Resolution="8" '
+        f'LUTName="{LUT_NAMES[c % 3]}" BytesInc="{c * xs * ys}">'
+        f"<ChannelProperty><Key>DyeName</Key><Value>Dye{c}</Value></ChannelProperty>"
+        f"</ChannelDescription>"
+        for c in range(channels)
+    )
+    dimension_xml = (
+        f'<DimensionDescription DimID="1" NumberOfElements="{xs}" Length="1e-4" Unit="m" BytesInc="1"/>'
+        f'<DimensionDescription DimID="2" NumberOfElements="{ys}" Length="8e-5" Unit="m" BytesInc="{xs}"/>'
+        f'<DimensionDescription DimID="3" NumberOfElements="{zs}" Length="2e-5" Unit="m" '
+        f'BytesInc="{xs * ys * channels}"/>'
+    )
+    if tiles > 1:
+        dimension_xml += (
+            f'<DimensionDescription DimID="10" NumberOfElements="{tiles}" '
+            f'BytesInc="{xs * ys * channels * zs}"/>'
+        )
+    scaling_xml = "".join(
+        '<ChannelScalingInfo BlackValue="0.1" WhiteValue="0.9"/>' for _ in range(channels)
+    )
+    detector_xml = "".join(f'<Detector Name="HyD{i}" Gain="{i}"/>' for i in range(detectors))
+    tile_xml = "".join(
+        f'<Tile FieldX="{i % 4}" FieldY="{i // 4}" PosX="{i * 0.001}" PosY="{i * 0.002}"/>'
+        for i in range(tiles)
+    )
+    return (
+        f'<Element Name="{name}" Visibility="1" UniqueID="{unique_id}"><Data>'
+        f'<Image TextDescription=""><ImageDescription>'
+        f"<Channels>{channel_xml}</Channels><Dimensions>{dimension_xml}</Dimensions>"
+        f"</ImageDescription>"
+        f'<Attachment Name="ViewerScaling">{scaling_xml}</Attachment>'
+        f'<Attachment Name="HardwareSetting" DataSourceTypeName="Confocal" SystemTypeName="TCS SP8">'
+        f'<ATLConfocalSettingDefinition ObjectiveName="HC PL APO 63x" NumericalAperture="1.4" '
+        f'RefractionIndex="1.52"><Spectro><MultiBand LeftWorld="500" RightWorld="550"/>'
+        f'<MultiBand LeftWorld="600" RightWorld="650"/></Spectro>{detector_xml}'
+        f"</ATLConfocalSettingDefinition></Attachment>"
+        f'<Attachment Name="TileScanInfo" FlipX="0" FlipY="0" SwapXY="0">{tile_xml}</Attachment>'
+        f"</Image></Data>"
+        f'<Memory Size="{xs * ys * channels * zs * tiles}" MemoryBlockID="{block_id}"/>'
+        f"<Children/></Element>"
+    )
+
+
+def lif_header_xml(images, images_per_folder=100, **image_options):
+    """
+    XML header of a LIF with the given number of images, grouped in folders
+    of images_per_folder, every fifth image a 16-tile scan. Returns the XML
+    and the (block ID, size) of every memory block.
+    """
+    blocks = [("MemBlock_0", 0)]
+    folders = []
+    for start in range(0, images, images_per_folder):
+        children = []
+        for i in range(start, min(start + images_per_folder, images)):
+            options = dict(image_options)
+            options.setdefault("tiles", 16 if i % 5 == 0 else 1)
+            block_id = f"MemBlock_{i + 1}"
+            xs, ys = options.get("xs", 64), options.get("ys", 48)
+            size = xs * ys * options.get("channels", 2) * options.get("zs", 3) * options["tiles"]
+            blocks.append((block_id, size))
+            children.append(image_xml(f"Image {i}", f"image-{i}", block_id, **options))
+        folders.append(
+            f'<Element Name="Folder {len(folders)}" UniqueID="folder-{len(folders)}">'
+            f'<Data><Experiment/></Data><Memory Size="0" MemoryBlockID="MemBlock_0"/>'
+            f'<Children>{"".join(children)}</Children></Element>'
+        )
+    xml = (
+        '<LMSDataContainerHeader Version="2"><Element Name="root" UniqueID="root">'
+        '<Data><Experiment/></Data><Memory Size="0" MemoryBlockID="MemBlock_0"/>'
+        f'<Children>{"".join(folders)}</Children></Element></LMSDataContainerHeader>'
+    )
+    return xml, blocks
+
+
+def make_lif(path, images, **image_options):
+    """
+    Write a LIF file with the given number of images (and images + 1 memory
+    blocks) and return its path.
+    """
+    xml, blocks = lif_header_xml(images, **image_options)
+    encoded = xml.encode("utf-16-le")
+    with open(path, "wb") as f:
+        f.write(struct.pack("<iiBi", 112, len(encoded) + 5, 42, len(xml)))
+        f.write(encoded)
+        for block_id, size in blocks:
+            encoded_id = block_id.encode("utf-16-le")
+            f.write(struct.pack("<iiBqBi", 112, size + 14 + len(encoded_id), 42, size, 42, len(block_id)))
+            f.write(encoded_id)
+            f.write(bytes(size))
+    return path
+
+
+def make_xlef_collection(folder, children, **image_options):
+    """
+    Write an XLEF collection with the given number of .xlif children (each
+    pointing to its own .lof file, which is not written) and return the path
+    of the .xlef file.
+    """
+    os.makedirs(folder, exist_ok=True)
+    references = []
+    for i in range(children):
+        file_name = f"image_{i}.xlif"
+        element = image_xml(f"Image {i}", f"image-{i}", "MemBlock_1", **image_options)
+        element = element.replace(
+            'MemoryBlockID="MemBlock_1"/>',
+            f'MemoryBlockID="MemBlock_1"><Block File="image_{i}.lof" Offset="0" Size="1"/></Memory>',
+        )
+        with open(os.path.join(folder, file_name), "w", encoding="utf-8") as f:
+            f.write(
+                '<?xml version="1.0" encoding="utf-8"?>'
+                f'<LMSDataContainerHeader Version="2">{element}</LMSDataContainerHeader>'
+            )
+        references.append(f'<Reference File="{file_name}" UUID="image-{i}"/>')
+
+    path = os.path.join(folder, "collection.xlef")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(
+            '<?xml version="1.0" encoding="utf-8"?><LMSDataContainerEnhancedHeader>'
+            '<Element Name="collection" UniqueID="collection">'
+            f'<Children>{"".join(references)}</Children></Element></LMSDataContainerEnhancedHeader>'
+        )
+    return path
+
+
+def best_time(function, repeat=5):
+    """
+    Fastest of repeat runs of function, in seconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
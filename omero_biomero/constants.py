@@ -2,6 +2,13 @@ BROWSABLE_FILE_EXTENSIONS = [
     ".lif",
 ]
 
+# Leica files whose images get_preview can render. XLEF files only point to
+# the LOF files holding the images, so their images are previewed through those.
+PREVIEW_FILE_EXTENSIONS = [
+    ".lif",
+    ".lof",
+]
+
 # This is a list of file extensions that are supported by Bio-Formats.
 # Generated from https://bio-formats.readthedocs.io/en/latest/_sources/supported-formats.rst.txt
 SUPPORTED_FILE_EXTENSIONS = [
@@ -1,196 +1,493 @@
-import mimetypes
-import os
 import math
 import numpy as np
 import cv2
-import glob
 import json
 import base64
 import tempfile
+from .LeicaPlaneReader import LeicaPlaneReader
+from .ParseLeicaImageXML import tile_positions_to_columns
+from .PreviewCache import (
+    DISK_CACHE_MAX_BYTES,
+    PREVIEW_FORMATS,
+    get_preview_cache,
+    preview_cache_key,
+    preview_format,
+)
 
-def create_png_from_metadata(metadata, preview_height=256, use_memmap=True):
+# How planes are reduced to the preview size: "stride" reads only every n-th
+# row and column, "mean" averages all pixels of each block (better quality,
+# reads more of the plane).
+DECIMATION_MODES = ("stride", "mean")
+
+# Upper bound on the bytes read from disk for one preview
+PREVIEW_READ_BUDGET = 64 * 1024 * 1024
+
+# How the preview contrast is set: "auto" applies the Leica black/white values
+# of the image when it has them and falls back to "percentile", which
+# stretches the 0.01-99.9 percentile range to the full range.
+CONTRAST_MODES = ("auto", "percentile")
+CONTRAST_PERCENTILES = (0.01, 99.9)
+
+# Which Z planes a preview shows: "center" the middle one, "mip" the maximum
+# intensity projection of the stack
+PROJECTION_MODES = ("center", "mip")
+# Largest number of Z planes a projection reads when no z_step is given
+MIP_MAX_SLICES = 32
+
+# Which tiles of a tile scan a preview shows: "center" the middle tile,
+# "mosaic" all tiles at their field positions
+TILE_MODES = ("center", "mosaic")
+
+# Heights rendered together, from one composite, whenever a preview of at
+# most the largest of them is rendered (see preview_pyramid_heights)
+PREVIEW_PYRAMID_HEIGHTS = (64, 256, 1024)
+
+def preview_read_steps(reader, preview_height, preview_width, decimation="stride", read_budget=PREVIEW_READ_BUDGET):
     """
-    Create a preview image from the metadata and return the path to the PNG file.
+    Return the (step_y, step_x) used to read a plane for a preview of
+    preview_height x preview_width.
+
+    "stride" skips rows and columns so that about one pixel per preview pixel
+    is read, "mean" reads every pixel and leaves the averaging to the resize.
+    Either way the row step is raised, if needed, until reading the plane
+    costs no more than about read_budget bytes.
+    """
+    if decimation not in DECIMATION_MODES:
+        raise ValueError(f"Unknown decimation mode: {decimation}")
+
+    if decimation == "stride":
+        step_y = max(1, reader.ys // preview_height)
+        step_x = max(1, reader.xs // max(preview_width, 1))
+    else:
+        step_y = step_x = 1
+
+    row_size = reader.read_size((reader.ys, step_x))
+    if reader.ys * row_size > read_budget:
+        step_y = max(step_y, int(math.ceil(reader.ys * row_size / read_budget)))
+    return step_y, step_x
+
+def render_preview(
+    metadata,
+    preview_height=256,
+    use_memmap=True,
+    decimation="stride",
+    read_budget=PREVIEW_READ_BUDGET,
+    contrast="auto",
+    projection="center",
+    z_step=None,
+    tile_mode="center",
+):
+    """
+    Render the preview image of an image from its metadata and return it as
+    an array (height x width x 3, uint8 or uint16), ready to be encoded.
+
+    decimation selects how planes are reduced (see DECIMATION_MODES) and
+    read_budget caps the bytes read from disk, shared by all planes read.
+    contrast selects how the contrast is set (see CONTRAST_MODES).
+    projection selects the Z planes shown (see PROJECTION_MODES); a "mip"
+    projection reads every z_step-th plane, by default at most
+    MIP_MAX_SLICES of them.
+    tile_mode selects the tiles shown of a tile scan (see TILE_MODES).
+    """
+    levels = render_preview_pyramid(
+        metadata,
+        preview_pyramid_heights(preview_height),
+        use_memmap,
+        decimation,
+        read_budget,
+        contrast,
+        projection,
+        z_step,
+        tile_mode,
+    )
+    return levels[preview_height]
+
+def preview_pyramid_heights(preview_height):
+    """
+    Heights rendered together with a preview of preview_height: the
+    PREVIEW_PYRAMID_HEIGHTS levels and preview_height itself, or just
+    preview_height when it is taller than the pyramid.
+
+    Every preview of at most the largest level is thus cut from the same
+    composite with the same contrast, so its pixels do not depend on which
+    height was asked for first.
+    """
+    if preview_height > max(PREVIEW_PYRAMID_HEIGHTS):
+        return (preview_height,)
+    return tuple(sorted(set(PREVIEW_PYRAMID_HEIGHTS) | {preview_height}))
+
+def render_preview_pyramid(
+    metadata,
+    preview_heights=PREVIEW_PYRAMID_HEIGHTS,
+    use_memmap=True,
+    decimation="stride",
+    read_budget=PREVIEW_READ_BUDGET,
+    contrast="auto",
+    projection="center",
+    z_step=None,
+    tile_mode="center",
+):
     """
+    Render previews of several heights from a single read of the plane and
+    return them as a dict of height to array (see render_preview).
+
+    The plane is read and composited once, for the largest height, which is
+    the base level of the pyramid; the smaller levels are downscaled from
+    that composite and all levels share the contrast stretch computed on the
+    base level. Heights are capped at the height of the image, so previews
+    are never upscaled.
+    """
+    if contrast not in CONTRAST_MODES:
+        raise ValueError(f"Unknown contrast mode: {contrast}")
+    if projection not in PROJECTION_MODES:
+        raise ValueError(f"Unknown projection mode: {projection}")
+    if tile_mode not in TILE_MODES:
+        raise ValueError(f"Unknown tile mode: {tile_mode}")
 
     # Ensure metadata is a dictionary
     if isinstance(metadata, str):  # If metadata is a JSON string, parse it
         metadata = json.loads(metadata)
 
-    # Determine fileName and basePos
-    filetype = metadata["filetype"]
-    if filetype == ".lif":
-        fileName = metadata["LIFFile"]
-        basePos = metadata["Position"]
-    elif filetype in [".xlef", ".lof"]:
-        fileName = metadata["LOFFilePath"]
-        basePos = 62
-    else:
-        raise ValueError("Unsupported filetype")
+    reader = LeicaPlaneReader(metadata, use_memmap=use_memmap)
 
     # Get image dimensions and other info
-    xs = metadata["xs"]
-    ys = metadata["ys"]
-    zs = metadata["zs"]
-    channels = metadata.get("channels", 1)
-    isrgb = metadata.get("isrgb", False)
-    channelResolution = metadata.get("channelResolution", [8] * channels)  # Assuming 8-bit as default
-    channelbytesinc = metadata.get("channelbytesinc", [0] * channels)  # Default empty list
-    zbytesinc = metadata.get("zbytesinc", 0)
-    tbytesinc = metadata.get("tbytesinc", 0)
-    tilesbytesinc = metadata.get("tilesbytesinc", 0)
-    ts = metadata.get("ts", 1)
-    tiles = metadata.get("tiles", 1)
-
-    # Center slice selection for t and s (tiles)
-    if ts > 1:
-        t = ts // 2
-        basePos += t * tbytesinc
-    if tiles > 1:
-        tile = tiles // 2
-        basePos += tile * tilesbytesinc
-
-    # Center slice selection for z
-    z = zs // 2 if zs > 1 else 0
-
-    # Determine preview image size
-    tscale = preview_height / ys
+    xs = reader.xs
+    ys = reader.ys
+    zs = reader.zs
+    channels = reader.channels
+    isrgb = reader.isrgb
+    ts = reader.ts
+    tiles = reader.tiles
+
+    # Center slice selection for t, s (tiles) and z
+    t = ts // 2 if ts > 1 else 0
+    tile = tiles // 2 if tiles > 1 else 0
+    if projection == "mip":
+        z_step = z_step or int(math.ceil(zs / MIP_MAX_SLICES))
+        z_planes = range(0, zs, z_step)
+    else:
+        z_planes = [zs // 2 if zs > 1 else 0]
+
+    # Grid positions of the tiles of a mosaic
+    fields = None
+    if tile_mode == "mosaic" and tiles > 1:
+        fields = mosaic_fields(metadata, tiles)
+    grid_columns = max(x for x, _ in fields) + 1 if fields else 1
+    grid_rows = max(y for _, y in fields) + 1 if fields else 1
+    extent_x = xs * grid_columns
+    extent_y = ys * grid_rows
+
+    # Determine preview image size of the largest level
+    level_heights = {height: min(height, extent_y) for height in preview_heights}
+    preview_height = max(level_heights.values())
+    tscale = preview_height / extent_y
     ysize = preview_height
-    xsize = int(xs * tscale)
-    skip_factor = int(math.ceil(ys / ysize))
-    totalRows = int(math.ceil(ys / skip_factor))
+    xsize = int(extent_x * tscale)
+    planes = 1 if isrgb else channels
+    plane_budget = read_budget // (planes * len(z_planes))
+
+    # Tiles to read, with their place on the preview and read steps
+    if fields is None:
+        step = preview_read_steps(reader, ysize, xsize, decimation, plane_budget)
+        placements = [(tile, 0, 0, xsize, ysize, step)]
+    else:
+        placements = []
+        for mosaic_tile, (column, row) in enumerate(fields):
+            x0, x1 = column * xsize // grid_columns, (column + 1) * xsize // grid_columns
+            y0, y1 = row * ysize // grid_rows, (row + 1) * ysize // grid_rows
+            if x1 > x0 and y1 > y0:
+                # I/O per tile follows its size on the preview
+                step = preview_read_steps(reader, y1 - y0, x1 - x0, decimation, plane_budget // tiles)
+                placements.append((mosaic_tile, x0, y0, x1, y1, step))
 
     # Determine data type
-    dtype, bytes_per_pixel, max_pixel_value = (np.uint8, 1, 255) if channelResolution[0] == 8 else (np.uint16, 2, 65535)
-
-    # Initialize the preview image
-    impreview = np.zeros((totalRows, xsize, 3), dtype=np.float32)
-
-    if use_memmap:
-        if isrgb:
-            data_offset = basePos + z * zbytesinc
-            slice_shape = (ys, xs, 3)
-            mmap_array = np.memmap(fileName, dtype=dtype, mode="r", offset=data_offset, shape=slice_shape, order="C")
-            selected_rows = mmap_array[::skip_factor, :, :]
-            impreview_data = cv2.resize(selected_rows, (xsize, ysize), interpolation=cv2.INTER_AREA)
-            impreview = impreview_data.astype(np.float32)
-        else:
-            temp_impreview = np.zeros((ysize, xsize, 3), dtype=np.float32)
-            for cht in range(channels):
-                data_offset = basePos + z * zbytesinc + channelbytesinc[cht]
-                slice_shape = (ys, xs)
-                mmap_array = np.memmap(fileName, dtype=dtype, mode="r", offset=data_offset, shape=slice_shape, order="C")
-                selected_rows = mmap_array[::skip_factor, :]
-                channel_data_resized = cv2.resize(selected_rows, (xsize, ysize), interpolation=cv2.INTER_AREA)
-
-                # Use direct indexing for lutname
-                lut_name = metadata["lutname"][cht]
-                color = convert_color_name_to_rgb(lut_name)
-                
-                for c in range(3):
-                    temp_impreview[:, :, c] += channel_data_resized * (color[c] / 255.0)
-            temp_impreview = np.clip(temp_impreview, 0, max_pixel_value)
-            impreview = temp_impreview
+    dtype = reader.dtype
+    max_pixel_value = 255 if dtype == np.uint8 else 65535
+
+    scaling_luts = None
+    if contrast == "auto":
+        scaling_luts = viewer_scaling_luts(metadata, planes, max_pixel_value, dtype)
+
+    if isrgb:
+        impreview = read_preview_plane(reader, 0, z_planes, t, placements, (xsize, ysize))
+        if scaling_luts is not None:
+            impreview = scaling_luts[0][impreview]
     else:
-        with open(fileName, "rb") as f:
-            if isrgb:
-                for i in range(totalRows):
-                    r_start = i * skip_factor
-                    offset = basePos + z * zbytesinc + r_start * xs * bytes_per_pixel * 3
-                    f.seek(offset, os.SEEK_SET)
-                    row_size = xs * 3 * bytes_per_pixel
-                    row_bytes = f.read(row_size)
-                    if len(row_bytes) < row_size:
-                        break
-                    row_pixels = np.frombuffer(row_bytes, dtype=dtype).reshape((1, xs, 3))
-                    row_pixels_resized = cv2.resize(row_pixels, (xsize, 1), interpolation=cv2.INTER_AREA)
-                    impreview[i, :, :] = row_pixels_resized[0, :, :]
-            else:
-                for i in range(totalRows):
-                    r_start = i * skip_factor
-                    row_data = np.zeros((xsize, 3), dtype=np.float32)
-                    for cht in range(channels):
-                        p = channelbytesinc[cht] + r_start * xs * bytes_per_pixel
-                        offset = basePos + z * zbytesinc + p
-                        f.seek(offset, os.SEEK_SET)
-                        row_size = xs * bytes_per_pixel
-                        row_bytes = f.read(row_size)
-                        if len(row_bytes) < row_size:
-                            break
-                        row_pixels = np.frombuffer(row_bytes, dtype=dtype).reshape((1, xs))
-                        row_pixels_resized = cv2.resize(row_pixels, (xsize, 1), interpolation=cv2.INTER_AREA).flatten()
-                        
-                        # Use direct indexing for lutname
-                        lut_name = metadata["lutname"][cht]
-                        color = convert_color_name_to_rgb(lut_name)
-
-                        for c in range(3):
-                            row_data[:, c] += row_pixels_resized * (color[c] / 255.0)
-                    row_data = np.clip(row_data, 0, max_pixel_value)
-                    impreview[i, :, :] = row_data
-
-    impreview = impreview.astype(dtype)
-    impreview = adjust_image_contrast(impreview, max_pixel_value)
+        # Decimated and resized channels, interleaved per pixel
+        stack = np.empty((ysize, xsize, channels), dtype=np.uint32)
+        for cht in range(channels):
+            resized = read_preview_plane(reader, cht, z_planes, t, placements, (xsize, ysize))
+            stack[:, :, cht] = resized if scaling_luts is None else scaling_luts[cht][resized]
+
+        # Use direct indexing for lutname
+        colors = [convert_color_name_to_rgb(metadata["lutname"][cht]) for cht in range(channels)]
+        impreview = composite_channels(stack, colors, max_pixel_value, dtype)
+
+    levels = {}
+    for height, level_height in level_heights.items():
+        if level_height == preview_height:
+            levels[height] = impreview
+        else:
+            size = (int(extent_x * level_height / extent_y), level_height)
+            levels[height] = cv2.resize(impreview, size, interpolation=cv2.INTER_AREA)
+
+    if scaling_luts is None:
+        min_val, max_val = histogram_percentiles(impreview, CONTRAST_PERCENTILES, max_pixel_value)
+        lut = contrast_lut(min_val, max_val, max_pixel_value, dtype)
+        levels = {height: lut[level] for height, level in levels.items()}
+    return levels
+
+def mosaic_fields(metadata, tiles):
+    """
+    Grid position (column, row) of every tile of a tile scan, from the
+    FieldX/FieldY of its tile_positions (per-tile records or columnar),
+    shifted to start at 0. Returns None when the positions do not describe
+    all tiles.
+
+    The stage flags of the TileScanInfo are applied: flipx and flipy
+    reverse the FieldX and FieldY axes, then swapxy exchanges them.
+    """
+    tile_positions = metadata.get("tile_positions")
+    if not tile_positions:
+        return None
+    columns = tile_positions_to_columns(tile_positions)
+    fields = list(zip(columns["FieldX"], columns["FieldY"]))
+    if len(fields) != tiles:
+        return None
+    min_x = min(x for x, _ in fields)
+    min_y = min(y for _, y in fields)
+    max_x = max(x for x, _ in fields)
+    max_y = max(y for _, y in fields)
+    flip_x = bool(metadata.get("flipx"))
+    flip_y = bool(metadata.get("flipy"))
+    grid = []
+    for x, y in fields:
+        column = max_x - x if flip_x else x - min_x
+        row = max_y - y if flip_y else y - min_y
+        grid.append((row, column) if metadata.get("swapxy") else (column, row))
+    return grid
+
+def read_preview_plane(reader, c, z_planes, t, placements, size):
+    """
+    Read channel c of the preview canvas of size (width, height) from
+    placements, a list of (tile, x0, y0, x1, y1, step): each tile is read
+    with its own step (see read_projected_plane) and put at [y0:y1, x0:x1].
+    Parts of the canvas without a tile stay black.
+    """
+    if len(placements) == 1 and placements[0][1:5] == (0, 0) + tuple(size):
+        tile, _, _, _, _, step = placements[0]
+        return read_projected_plane(reader, c, z_planes, t, tile, step, size)
+
+    width, height = size
+    canvas = np.zeros((height, width, 3) if reader.isrgb else (height, width), dtype=reader.dtype)
+    for tile, x0, y0, x1, y1, step in placements:
+        canvas[y0:y1, x0:x1] = read_projected_plane(reader, c, z_planes, t, tile, step, (x1 - x0, y1 - y0))
+    return canvas
+
+def read_projected_plane(reader, c, z_planes, t, tile, step, size):
+    """
+    Read channel c of the given Z planes, decimated by step and resized to
+    size (width, height), and return their maximum projection.
+
+    Planes are streamed one at a time through a running maximum, so memory
+    stays at one preview-sized buffer however many planes are read.
+    """
+    projection = None
+    for z in z_planes:
+        selected_rows = reader.read_plane(c=c, z=z, t=t, tile=tile, step=step)
+        resized = cv2.resize(selected_rows, size, interpolation=cv2.INTER_AREA)
+        if projection is None:
+            projection = resized
+        else:
+            np.maximum(projection, resized, out=projection)
+    return projection
+
+def composite_channels(stack, colors, max_pixel_value, dtype):
+    """
+    Blend interleaved channels (height x width x channels, uint32) into one
+    3-channel image of the given dtype, where colors holds the 0-255 colour
+    of every channel.
+
+    The colours form a channels x 3 LUT matrix that is applied to all pixels
+    in a single integer matrix product, so no float copies of the image are
+    made and the result matches the per-channel float blend exactly.
+    """
+    height, width, channels = stack.shape
+    lut = np.asarray(colors, dtype=np.uint32).reshape(channels, 3)
+    composite = stack.reshape(-1, channels) @ lut
+    composite //= 255
+    np.minimum(composite, max_pixel_value, out=composite)
+    return composite.reshape(height, width, 3).astype(dtype)
+
+def encode_preview(impreview, image_format="png", quality=None):
+    """
+    Encode a rendered preview in one of PREVIEW_FORMATS and return the bytes.
+
+    PNG keeps 16-bit previews as they are. WebP and JPEG only take 8 bits, so
+    16-bit previews are reduced to their high byte first; quality (1-100)
+    defaults to the format's default.
+    """
+    image_format, quality = preview_format(image_format, quality)
+    params = []
+    if image_format != "png":
+        if impreview.dtype != np.uint8:
+            impreview = (impreview >> 8).astype(np.uint8)
+        quality_flag = cv2.IMWRITE_WEBP_QUALITY if image_format == "webp" else cv2.IMWRITE_JPEG_QUALITY
+        params = [quality_flag, quality]
+
+    ok, buffer = cv2.imencode(PREVIEW_FORMATS[image_format]["extension"], impreview, params)
+    if not ok:
+        raise ValueError("Could not encode the preview image")
+    return buffer.tobytes()
+
+def create_preview_bytes(metadata, preview_height=256, use_memmap=True, image_format="png", quality=None, **render_options):
+    """
+    Create a preview image from the metadata and return it encoded as
+    image_format (see encode_preview).
+    render_options (decimation, read_budget, contrast, projection, z_step,
+    tile_mode) are passed to render_preview.
+    """
+    impreview = render_preview(metadata, preview_height, use_memmap, **render_options)
+    return encode_preview(impreview, image_format, quality)
+
+def create_png_from_metadata(metadata, preview_height=256, use_memmap=True, **render_options):
+    """
+    Create a preview image from the metadata and return the path to the PNG file.
+    The caller is responsible for removing the file.
+    """
+    data = create_preview_bytes(metadata, preview_height, use_memmap, **render_options)
     with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as temp_file:
-        temp_image_path = temp_file.name
-        cv2.imwrite(temp_image_path, impreview)
-    return temp_image_path
+        temp_file.write(data)
+    return temp_file.name
+
+def _render_options(decimation, read_budget, contrast, projection, z_step, tile_mode):
+    # Options passed to render_preview_pyramid, as stored in cache keys
+    return {
+        "decimation": decimation,
+        "read_budget": read_budget,
+        "contrast": contrast,
+        "projection": projection,
+        "z_step": z_step if projection == "mip" else None,
+        "tile_mode": tile_mode,
+    }
 
-def create_preview_image(metadata, cache_folder, preview_height=256, use_memmap=True, max_cache_size=100):
+def _cache_preview_pyramid(metadata, cache, preview_height, pyramid_heights, use_memmap, image_format, quality, render_options):
+    # Render the pyramid of preview_height from one composite, exactly as
+    # render_preview does, store preview_height and the levels of
+    # pyramid_heights that are not cached yet and return the path and bytes
+    # of preview_height. Which levels are stored does not change their bytes.
+    levels = render_preview_pyramid(
+        metadata, preview_pyramid_heights(preview_height), use_memmap, **render_options
+    )
+    for height, impreview in levels.items():
+        if height != preview_height and height not in pyramid_heights:
+            continue
+        key = preview_cache_key(metadata, height, image_format, quality=quality, **render_options)
+        if height != preview_height and cache.get_path(key) is not None:
+            continue
+        data = encode_preview(impreview, image_format, quality)
+        path = cache.put(key, data)
+        if height == preview_height:
+            result = path, data
+    return result
+
+def create_preview_image(
+    metadata,
+    cache_folder,
+    preview_height=256,
+    use_memmap=True,
+    max_cache_bytes=DISK_CACHE_MAX_BYTES,
+    decimation="stride",
+    read_budget=PREVIEW_READ_BUDGET,
+    contrast="auto",
+    projection="center",
+    z_step=None,
+    tile_mode="center",
+    image_format="png",
+    quality=None,
+    pyramid_heights=PREVIEW_PYRAMID_HEIGHTS,
+):
     """
-    Create a preview image from the metadata and save it as a PNG file in the cache folder.
+    Create a preview image from the metadata and save it in the cache folder,
+    encoded as image_format (png, webp or jpeg) with the given quality.
     If a cached image exists, it returns the path to the cached image.
+
+    Previews are keyed by the source file's fingerprint, the image UniqueID,
+    the height, the format and the render options (see preview_cache_key) and kept in a PreviewCache of at
+    most max_cache_bytes on disk (the budget applies when the cache folder is
+    first used in this process).
+
+    A missing preview is rendered together with its pyramid (see
+    preview_pyramid_heights) from one read of the plane, and cached with the
+    levels of pyramid_heights that are not cached yet. The bytes of every
+    level are those render_preview produces, whichever height is asked for
+    first, and no preview is taller than the image.
     """
     # Ensure metadata is a dictionary
     if isinstance(metadata, str):  # If metadata is a JSON string, parse it
         metadata = json.loads(metadata)
 
-    # Ensure cache_folder exists
-    if not os.path.exists(cache_folder):
-        os.makedirs(cache_folder)
-
-    # Generate a unique cache filename using uuid and preview_height
-    if "UniqueID" not in metadata:
-        raise ValueError("metadata does not contain a UniqueID")
-
-    uuid = metadata["UniqueID"]
-    cache_filename = f"{uuid}_h{preview_height}.png"
-    cache_image_path = os.path.join(cache_folder, cache_filename)
+    image_format, quality = preview_format(image_format, quality)
+    render_options = _render_options(decimation, read_budget, contrast, projection, z_step, tile_mode)
+    cache = get_preview_cache(cache_folder, disk_max_bytes=max_cache_bytes)
+    key = preview_cache_key(metadata, preview_height, image_format, quality=quality, **render_options)
 
     # Check if the cached image exists
-    if os.path.exists(cache_image_path):
+    cache_image_path = cache.get_path(key)
+    if cache_image_path is not None:
         return cache_image_path
 
-    temp_image_path = create_png_from_metadata(metadata, preview_height, use_memmap)
-    cv2.imwrite(cache_image_path, cv2.imread(temp_image_path))
-    os.remove(temp_image_path)
-    manage_cache(cache_folder, max_cache_size)
-
-    return cache_image_path
+    path, _ = _cache_preview_pyramid(
+        metadata, cache, preview_height, pyramid_heights, use_memmap, image_format, quality, render_options
+    )
+    return path
 
-def create_preview_base64_image(metadata, preview_height=256, use_memmap=True):
+def get_cached_preview_bytes(
+    metadata,
+    cache_folder,
+    preview_height=256,
+    use_memmap=True,
+    max_cache_bytes=DISK_CACHE_MAX_BYTES,
+    decimation="stride",
+    read_budget=PREVIEW_READ_BUDGET,
+    contrast="auto",
+    projection="center",
+    z_step=None,
+    tile_mode="center",
+    image_format="png",
+    quality=None,
+    pyramid_heights=PREVIEW_PYRAMID_HEIGHTS,
+):
     """
-    Create a preview image from the metadata and return it as a base64 encoded PNG image.
+    Like create_preview_image, but return the encoded bytes, served from the
+    in-memory tier of the cache when possible.
     """
-    temp_image_path = create_png_from_metadata(metadata, preview_height, use_memmap)
+    # Ensure metadata is a dictionary
+    if isinstance(metadata, str):  # If metadata is a JSON string, parse it
+        metadata = json.loads(metadata)
 
-    mime_type, _ = mimetypes.guess_type(temp_image_path)
-    if mime_type is None:
-        raise ValueError("Could not determine MIME type of the image.")
+    image_format, quality = preview_format(image_format, quality)
+    render_options = _render_options(decimation, read_budget, contrast, projection, z_step, tile_mode)
+    cache = get_preview_cache(cache_folder, disk_max_bytes=max_cache_bytes)
+    key = preview_cache_key(metadata, preview_height, image_format, quality=quality, **render_options)
 
-    with open(temp_image_path, "rb") as image_file:
-        encoded_string = base64.b64encode(image_file.read()).decode("utf-8")
+    data = cache.get(key)
+    if data is None:
+        _, data = _cache_preview_pyramid(
+            metadata, cache, preview_height, pyramid_heights, use_memmap, image_format, quality, render_options
+        )
+    return data
 
-    os.remove(temp_image_path)
+def create_preview_base64_image(metadata, preview_height=256, use_memmap=True, image_format="png", quality=None, **render_options):
+    """
+    Create a preview image from the metadata and return it as a base64 encoded
+    data URL, encoded as image_format (png, webp or jpeg).
+    """
+    data = create_preview_bytes(metadata, preview_height, use_memmap, image_format, quality, **render_options)
+    encoded_string = base64.b64encode(data).decode("utf-8")
+    mime_type = PREVIEW_FORMATS[image_format]["mime_type"]
     return f"data:{mime_type};base64,{encoded_string}"
 
-def manage_cache(cache_folder, max_cache_size):
-    cached_files = glob.glob(os.path.join(cache_folder, "*.png"))
-    if len(cached_files) > max_cache_size:
-        files_with_mtime = sorted(cached_files, key=os.path.getmtime)
-        for file in files_with_mtime[:len(cached_files) - max_cache_size]:
-            os.remove(file)
-
 def convert_color_name_to_rgb(color_name):
     color_map = {
         "blue": (0, 0, 255), "red": (255, 0, 0), "yellow": (255, 255, 0),
@@ -199,9 +496,69 @@ def convert_color_name_to_rgb(color_name):
     }
     return color_map.get(color_name.strip().lower(), (255, 255, 255))
 
-def adjust_image_contrast(impreview, max_pixel_value):
-    im_float = impreview.astype(np.float32)
-    min_val, max_val = np.percentile(im_float, [0.01, 99.9])
+def contrast_lut(min_val, max_val, max_pixel_value, dtype):
+    """
+    Lookup table (one entry per pixel value) that stretches min_val..max_val
+    to the full range, clipping values outside it.
+    """
     max_val = max_val if max_val - min_val > 0 else min_val + 1
-    im_adj = np.clip((im_float - min_val) / (max_val - min_val), 0, 1) * max_pixel_value
-    return im_adj.astype(impreview.dtype)
\ No newline at end of file
+    values = np.arange(max_pixel_value + 1, dtype=np.float32)
+    lut = np.clip((values - min_val) / (max_val - min_val), 0, 1) * max_pixel_value
+    return lut.astype(dtype)
+
+def viewer_scaling_luts(metadata, channels, max_pixel_value, dtype):
+    """
+    Contrast lookup tables for the first channels of an image, built from the
+    black and white values (fractions of the range of the channel's
+    channelResolution bits) that Leica stores in the ViewerScaling
+    attachment. Returns None when the image has no viewer scaling, i.e.
+    every channel still has the default 0 and 1.
+    """
+    black = metadata.get("blackvalue") or []
+    white = metadata.get("whitevalue") or []
+    if len(black) < channels or len(white) < channels:
+        return None
+    if all(b == 0 and w == 1 for b, w in zip(black[:channels], white[:channels])):
+        return None
+    # The values are fractions of the channel's own range, e.g. 0-4095 for a
+    # 12-bit channel stored in 16 bits
+    resolution = metadata.get("channelResolution") or []
+    luts = []
+    for c in range(channels):
+        bits = resolution[c] if c < len(resolution) and resolution[c] else None
+        channel_max = 2**bits - 1 if bits else max_pixel_value
+        channel_max = min(channel_max, max_pixel_value)
+        luts.append(contrast_lut(black[c] * channel_max, white[c] * channel_max, max_pixel_value, dtype))
+    return luts
+
+def histogram_percentiles(image, percentiles, max_pixel_value):
+    """
+    Percentiles of all values in a uint8/uint16 image, from a histogram with
+    one bin per pixel value. Gives the same result as np.percentile (linear
+    interpolation) without sorting or copying the image.
+    """
+    values = image.reshape(image.shape[0], -1)
+    # calcHist counts in float32, which is exact up to 2**24, so large images
+    # are counted in blocks of rows
+    rows = max(1, (1 << 24) // values.shape[1])
+    hist = np.zeros(max_pixel_value + 1, dtype=np.int64)
+    for start in range(0, values.shape[0], rows):
+        block = np.ascontiguousarray(values[start:start + rows])
+        hist += cv2.calcHist([block], [0], None, [max_pixel_value + 1], [0, max_pixel_value + 1]).ravel().astype(np.int64)
+
+    cumulative = np.cumsum(hist)
+    result = []
+    for percentile in percentiles:
+        rank = percentile / 100 * (cumulative[-1] - 1)
+        below, above = math.floor(rank), math.ceil(rank)
+        low = np.searchsorted(cumulative, below, side="right")
+        high = np.searchsorted(cumulative, above, side="right")
+        result.append(low + (high - low) * (rank - below))
+    return result
+
+def adjust_image_contrast(impreview, max_pixel_value):
+    """
+    Stretch the 0.01-99.9 percentile range of the preview to the full range.
+    """
+    min_val, max_val = histogram_percentiles(impreview, CONTRAST_PERCENTILES, max_pixel_value)
+    return contrast_lut(min_val, max_val, max_pixel_value, impreview.dtype)[impreview]
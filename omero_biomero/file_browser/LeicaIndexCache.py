@@ -0,0 +1,134 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the layout of a stored index changes, so stale indexes are
+# rebuilt instead of being served in the old shape.
+INDEX_VERSION = 2
+
+# Total size of the stored indexes; the least recently used ones are removed
+# beyond this
+INDEX_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+
+def get_index_cache_folder():
+    """
+    Folder where parsed Leica indexes are stored.
+
+    Defaults to a folder in the system temp dir, override with the
+    LEICA_INDEX_CACHE_PATH environment variable.
+    """
+    return os.getenv(
+        "LEICA_INDEX_CACHE_PATH",
+        os.path.join(tempfile.gettempdir(), "omero_biomero", "leica_index"),
+    )
+
+
+def file_fingerprint(file_path):
+    """
+    Return the (size, mtime) fingerprint used to invalidate cached indexes.
+    """
+    stat = os.stat(file_path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+
+def _index_file_path(kind, file_path):
+    key = os.path.normcase(os.path.abspath(file_path))
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return os.path.join(get_index_cache_folder(), f"{kind}_{digest}.json")
+
+
+def load_index(kind, file_path, fingerprint):
+    """
+    Load a cached index for file_path.
+
+    Returns None when there is no index yet, or when it was built for another
+    version of the file (different size or mtime) or another index layout.
+    """
+    index_path = _index_file_path(kind, file_path)
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if (
+        stored.get("version") != INDEX_VERSION
+        or stored.get("fingerprint") != fingerprint
+    ):
+        return None
+
+    # The mtime of an index is its last use, see prune_index_cache
+    try:
+        os.utime(index_path)
+    except OSError:
+        pass
+    return stored.get("index")
+
+
+def save_index(kind, file_path, fingerprint, index):
+    """
+    Store an index for file_path. The file is written next to its final
+    location and renamed into place, so readers never see a partial index.
+    Failures are logged and otherwise ignored; the index is only a cache.
+    """
+    index_path = _index_file_path(kind, file_path)
+    stored = {
+        "version": INDEX_VERSION,
+        "file": os.path.abspath(file_path),
+        "fingerprint": fingerprint,
+        "index": index,
+    }
+    try:
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(index_path), suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(stored, f, separators=(",", ":"))
+            os.replace(temp_path, index_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+    except OSError as e:
+        logger.warning(f"Could not write Leica index for {file_path}: {e}")
+        return
+    prune_index_cache()
+
+
+def prune_index_cache(max_bytes=INDEX_CACHE_MAX_BYTES):
+    """
+    Remove the least recently used indexes until the stored indexes take at
+    most max_bytes. Indexes are only written when a file is indexed, so the
+    folder is listed then rather than kept in memory.
+    """
+    folder = get_index_cache_folder()
+    entries = []
+    try:
+        with os.scandir(folder) as it:
+            for entry in it:
+                if not entry.name.endswith(".json") or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, entry.path, stat.st_size))
+    except OSError as e:
+        logger.warning(f"Could not list Leica index cache {folder}: {e}")
+        return
+
+    total = sum(size for _, _, size in entries)
+    for _, path, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not evict Leica index {path}: {e}")
+            continue
+        total -= size
@@ -0,0 +1,147 @@
+import os
+import json
+import mmap
+import numpy as np
+from .ReadLeicaLOF import read_lof_data_offset
+
+
+class LeicaPlaneReader:
+    """
+    Random access to the 2D planes of a Leica LIF/LOF image.
+
+    Offsets are derived once from the metadata returned by read_leica_file
+    (Position and the *bytesinc fields), and for LOF files from the LOF
+    header itself. With use_memmap=True (default) planes are returned as
+    zero-copy views over a read-only memmap of the image memory block, so
+    only the pages that are actually touched are read from disk.
+    """
+
+    def __init__(self, metadata, use_memmap=True):
+        # Ensure metadata is a dictionary
+        if isinstance(metadata, str):  # If metadata is a JSON string, parse it
+            metadata = json.loads(metadata)
+
+        filetype = metadata["filetype"]
+        if filetype == ".lif":
+            self.file_path = metadata["LIFFile"]
+            self.base_pos = metadata["Position"]
+            block_size = metadata.get("MemorySize")
+        elif filetype in [".xlef", ".lof"]:
+            self.file_path = metadata["LOFFilePath"]
+            if "Position" in metadata:
+                self.base_pos = metadata["Position"]
+                block_size = metadata.get("MemorySize")
+            else:
+                self.base_pos, block_size = read_lof_data_offset(self.file_path)
+        else:
+            raise ValueError("Unsupported filetype")
+
+        self.xs = metadata["xs"]
+        self.ys = metadata["ys"]
+        self.zs = metadata.get("zs", 1)
+        self.ts = metadata.get("ts", 1)
+        self.tiles = metadata.get("tiles", 1)
+        self.channels = metadata.get("channels", 1)
+        self.isrgb = metadata.get("isrgb", False)
+
+        channel_resolution = metadata.get("channelResolution") or [8]
+        self.dtype = np.dtype(np.uint8 if channel_resolution[0] == 8 else np.uint16)
+        self.bytes_per_pixel = self.dtype.itemsize
+
+        self.channelbytesinc = [
+            inc or 0 for inc in metadata.get("channelbytesinc") or [0] * self.channels
+        ]
+        samples = 3 if self.isrgb else 1
+        self.xbytesinc = metadata.get("xbytesinc") or self.bytes_per_pixel * samples
+        self.ybytesinc = metadata.get("ybytesinc") or self.xs * self.xbytesinc
+        self.zbytesinc = metadata.get("zbytesinc", 0)
+        self.tbytesinc = metadata.get("tbytesinc", 0)
+        self.tilesbytesinc = metadata.get("tilesbytesinc", 0)
+        # Bytes from the first to the last byte of a row
+        self.row_span = (self.xs - 1) * self.xbytesinc + self.bytes_per_pixel * samples
+
+        if not block_size:
+            block_size = os.path.getsize(self.file_path) - self.base_pos
+        self.block_size = block_size
+
+        self.use_memmap = use_memmap
+        self._data = None
+        if use_memmap:
+            self._data = np.memmap(
+                self.file_path,
+                dtype=np.uint8,
+                mode="r",
+                offset=self.base_pos,
+                shape=(block_size,),
+            )
+
+    def plane_offset(self, c=0, z=0, t=0, tile=0):
+        """
+        Byte offset of a plane, relative to the start of the image memory block.
+        """
+        return (
+            self.channelbytesinc[c]
+            + z * self.zbytesinc
+            + t * self.tbytesinc
+            + tile * self.tilesbytesinc
+        )
+
+    def read_size(self, step=1):
+        """
+        Estimate the number of bytes read from disk by read_plane(step=step).
+
+        Every selected row costs its full span, unless the memmap columns are
+        at least a page apart, in which case only one page per column is read.
+        """
+        step_y, step_x = (step, step) if np.isscalar(step) else step
+        rows = -(-self.ys // step_y)
+        if self.use_memmap and step_x * self.xbytesinc >= mmap.PAGESIZE:
+            return rows * -(-self.xs // step_x) * mmap.PAGESIZE
+        return rows * self.row_span
+
+    def read_plane(self, c=0, z=0, t=0, tile=0, step=1):
+        """
+        Return one plane as a (ys, xs) array, or (ys, xs, 3) for RGB images
+        (where c is ignored and all three samples are returned).
+
+        step decimates the plane: an int applies to both axes, a
+        (step_y, step_x) tuple sets them separately. With use_memmap the
+        result is a strided view on the memmap; otherwise only the selected
+        rows are read from the file.
+        """
+        step_y, step_x = (step, step) if np.isscalar(step) else step
+        offset = self.plane_offset(0 if self.isrgb else c, z, t, tile)
+
+        if self.isrgb:
+            shape = (self.ys, self.xs, 3)
+            strides = (self.ybytesinc, self.xbytesinc, self.bytes_per_pixel)
+        else:
+            shape = (self.ys, self.xs)
+            strides = (self.ybytesinc, self.xbytesinc)
+
+        if self.use_memmap:
+            plane = np.ndarray(
+                shape,
+                dtype=self.dtype,
+                buffer=self._data,
+                offset=offset,
+                strides=strides,
+            )
+            return plane[::step_y, ::step_x]
+
+        # Read only the selected rows, each as one contiguous span
+        row_span = self.row_span
+        rows = range(0, self.ys, step_y)
+        buffer = np.empty((len(rows), row_span), dtype=np.uint8)
+        with open(self.file_path, "rb") as f:
+            for i, row in enumerate(rows):
+                f.seek(self.base_pos + offset + row * self.ybytesinc, os.SEEK_SET)
+                if f.readinto(memoryview(buffer[i])) < row_span:
+                    raise ValueError(f"Unexpected end of file: {self.file_path}")
+        plane = np.ndarray(
+            (len(rows),) + shape[1:],
+            dtype=self.dtype,
+            buffer=buffer,
+            strides=(row_span,) + strides[1:],
+        )
+        return plane[:, ::step_x]
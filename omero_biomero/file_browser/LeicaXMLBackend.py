@@ -0,0 +1,82 @@
+import os
+import xml.etree.ElementTree as ET
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:  # lxml is optional
+    lxml_etree = None
+
+# XML backend used by the Leica readers: lxml when it is installed, the
+# standard library ElementTree otherwise. Set LEICA_XML_BACKEND=etree to force
+# ElementTree.
+if lxml_etree is not None and os.getenv("LEICA_XML_BACKEND", "").lower() != "etree":
+    BACKEND = "lxml"
+else:
+    BACKEND = "etree"
+
+# Exceptions raised for malformed XML by either backend
+if lxml_etree is not None:
+    PARSE_ERRORS = (ET.ParseError, lxml_etree.ParseError)
+else:
+    PARSE_ERRORS = (ET.ParseError,)
+
+
+def _lxml_parser(**kwargs):
+    # lxml parsers must not be shared between threads, so every call gets its
+    # own. huge_tree lifts libxml2's limits on text size and tree depth, which
+    # large Leica headers can exceed.
+    return lxml_etree.XMLParser(huge_tree=True, **kwargs)
+
+
+def xml_fromstring(text):
+    """
+    Parse XML from a str or bytes and return the root element.
+    """
+    if BACKEND == "lxml":
+        if isinstance(text, str):
+            # lxml refuses str input that carries an encoding declaration
+            # (LIF headers declare UTF-16), so hand it over as UTF-8 bytes
+            return lxml_etree.fromstring(
+                text.encode("utf-8"), _lxml_parser(encoding="utf-8")
+            )
+        return lxml_etree.fromstring(text, _lxml_parser())
+    return ET.fromstring(text)
+
+
+def xml_parse(file_path):
+    """
+    Parse an XML file and return its root element.
+    """
+    if BACKEND == "lxml":
+        return lxml_etree.parse(file_path, _lxml_parser()).getroot()
+    return ET.parse(file_path).getroot()
+
+
+def xml_pull_parser(events=("start", "end")):
+    """
+    Return an incremental parser (feed/read_events/close) that reports the
+    given events. It accepts both str and bytes chunks.
+    """
+    if BACKEND == "lxml":
+        return lxml_etree.XMLPullParser(events=events, huge_tree=True)
+    return ET.XMLPullParser(events=events)
+
+
+def xml_tostring(element):
+    """
+    Serialize an element (including its tail) to a str.
+    """
+    if BACKEND == "lxml":
+        return lxml_etree.tostring(element, encoding="unicode")
+    return ET.tostring(element, encoding="unicode")
+
+
+def find_element_by_uuid(root, unique_id):
+    """
+    Return the first Element below root whose UniqueID is unique_id, or None.
+
+    Both backends use an ElementPath search: on lxml it stops at the first
+    match and is faster than the equivalent XPath queries, which evaluate
+    the predicate over the whole tree.
+    """
+    return root.find(f".//Element[@UniqueID='{unique_id}']")
@@ -3,14 +3,467 @@ import xml.etree.ElementTree as ET
 ###############################################################################
 # Shared metadata parser for images
 ###############################################################################
-def parse_image_xml(xml_element):
+def parse_image_summary(xml_element):
+    """
+    Parses only what is needed to list an image: name, UUID and dimensions.
+    Channel details and attachments (hardware settings, tile positions, ...)
+    are skipped; use parse_image_xml for the full metadata. This is the
+    'listing' profile of parse_image_xml.
+
+    Returns:
+        A dictionary with the same keys and values as parse_image_xml for
+        UniqueID, ElementName, xs, ys, zs, ts, tiles, channels, isrgb and
+        dimensions.
+    """
+    metadata = {}
+    metadata['xs'] = 1
+    metadata['ys'] = 1
+    metadata['zs'] = 1
+    metadata['ts'] = 1
+    metadata['tiles'] = 1
+    metadata['channels'] = 1
+    metadata['isrgb'] = False
+
+    if xml_element.tag == 'Element':
+        metadata['UniqueID'] = xml_element.attrib.get('UniqueID')
+        metadata['ElementName'] = xml_element.attrib.get('Name', '')
+    else:
+        metadata['UniqueID'] = 'none (LOF)'
+        metadata['ElementName'] = 'none (LOF)'
+
+    image_description = xml_element.find('.//ImageDescription')
+    if image_description is not None:
+        channels_element = image_description.find('Channels')
+        if channels_element is not None:
+            channel_descriptions = channels_element.findall('ChannelDescription')
+            metadata['channels'] = len(channel_descriptions)
+            if metadata['channels'] > 1:
+                channel_tag = channel_descriptions[0].attrib.get('ChannelTag')
+                if channel_tag and int(channel_tag) != 0:
+                    metadata['isrgb'] = True
+
+        dimensions_element = image_description.find('Dimensions')
+        if dimensions_element is not None:
+            for dim_desc in dimensions_element.findall('DimensionDescription'):
+                dim_id = int(dim_desc.attrib.get('DimID', '0'))
+                num_elements = int(dim_desc.attrib.get('NumberOfElements', '0'))
+                if dim_id == 1:
+                    metadata['xs'] = num_elements
+                elif dim_id == 2:
+                    metadata['ys'] = num_elements
+                elif dim_id == 3:
+                    metadata['zs'] = num_elements
+                elif dim_id == 4:
+                    metadata['ts'] = num_elements
+                elif dim_id == 10:
+                    metadata['tiles'] = num_elements
+
+    metadata['dimensions'] = {
+        'x': metadata['xs'],
+        'y': metadata['ys'],
+        'z': metadata['zs'],
+        'c': metadata['channels'],
+        't': metadata['ts'],
+        's': metadata['tiles'],
+        'isrgb': metadata['isrgb'],
+    }
+
+    return metadata
+
+
+# Attachments parse_image_xml extracts metadata from. Only the first
+# attachment with a given name is used.
+IMAGE_ATTACHMENTS = ('ViewerScaling', 'TileScanInfo', 'HardwareSetting')
+
+# Metadata profiles of parse_image_xml, from cheapest to most complete:
+#   listing: name, UUID and dimensions (see parse_image_summary)
+#   preview: everything needed to read and render planes (sizes, strides,
+#            LUTs, black/white values, tile positions), no hardware settings
+#   full:    everything, including objective, filters and wavelengths
+METADATA_PROFILES = ('listing', 'preview', 'full')
+
+# Attachments that are parsed for each profile (listing parses none)
+PROFILE_ATTACHMENTS = {
+    'preview': ('ViewerScaling', 'TileScanInfo'),
+    'full': IMAGE_ATTACHMENTS,
+}
+
+# Per-tile fields of tile_positions, in record order after 'num'
+TILE_POSITION_FIELDS = ('FieldX', 'FieldY', 'PosX', 'PosY')
+
+
+# Excitation/emission wavelengths for widefield filter cubes
+EX_EM_WAVELENGTHS = {
+    'DAPI': (355, 460),
+    'DAP': (355, 460),
+    'A': (355, 460),
+    'Blue': (355, 460),
+    'L5': (480, 527),
+    'I5': (480, 527),
+    'Green': (480, 527),
+    'FITC': (480, 527),
+    'N3': (545, 605),
+    'N2.1': (545, 605),
+    'TRITC': (545, 605),
+    '488': (488, 525),
+    '532': (532, 550),
+    '642': (642, 670),
+    'Red': (545, 605),
+    'Y3': (545, 605),
+    'I3': (545, 605),
+    'Y5': (590, 700),
+}
+
+
+def collect_image_nodes(xml_element, attachment_names=IMAGE_ATTACHMENTS):
+    """
+    Walks the element tree once, in document order, and collects the nodes
+    parse_image_xml needs: the first ImageDescription, the first Memory/Block
+    and the first Attachment for each name in attachment_names.
+
+    The walk does not descend into ImageDescription or Memory elements, nor
+    into the attachments of IMAGE_ATTACHMENTS, whether they are collected or
+    not (a HardwareSetting alone can hold thousands of elements); other
+    attachments are searched, as some wrap the ones needed (e.g. a
+    HardwareSetting in a list of settings). It stops as soon as everything
+    has been found.
+
+    Returns:
+        (image_description, memory_block, attachments) where attachments maps
+        attachment name to element.
+    """
+    image_description = None
+    memory_block = None
+    attachments = {}
+
+    stack = list(xml_element)
+    stack.reverse()
+    while stack:
+        node = stack.pop()
+        tag = node.tag
+        if tag == 'Attachment' and node.attrib.get('Name') in IMAGE_ATTACHMENTS:
+            name = node.attrib['Name']
+            if name in attachment_names and name not in attachments:
+                attachments[name] = node
+        elif tag == 'ImageDescription':
+            if image_description is None:
+                image_description = node
+        elif tag == 'Memory':
+            if memory_block is None:
+                memory_block = node.find('Block')
+        else:
+            children = list(node)
+            children.reverse()
+            stack.extend(children)
+            continue
+
+        if (
+            image_description is not None
+            and memory_block is not None
+            and len(attachments) == len(attachment_names)
+        ):
+            break
+
+    return image_description, memory_block, attachments
+
+
+def _append_channel(metadata, channel_desc):
+    bytes_inc = channel_desc.attrib.get('BytesInc')
+    resolution = channel_desc.attrib.get('Resolution')
+    lut_name = channel_desc.attrib.get('LUTName')
+    metadata['channelbytesinc'].append(int(bytes_inc) if bytes_inc else None)
+    metadata['channelResolution'].append(int(resolution) if resolution else None)
+    metadata['lutname'].append(lut_name.lower() if lut_name else '')
+
+
+def _parse_channels(image_description, metadata):
+    """
+    Fills the per-channel fields and returns the ChannelDescription elements.
+    """
+    channel_descriptions = []
+    channels_element = image_description.find('Channels')
+    if channels_element is not None:
+        channel_descriptions = channels_element.findall('ChannelDescription')
+        metadata['channels'] = len(channel_descriptions)
+        if metadata['channels'] > 1:
+            channel_tag = channel_descriptions[0].attrib.get('ChannelTag')
+            if channel_tag and int(channel_tag) != 0:
+                metadata['isrgb'] = True
+        for channel_desc in channel_descriptions:
+            _append_channel(metadata, channel_desc)
+    else:
+        # Single channel, handle separately
+        channel_desc = image_description.find('.//ChannelDescription')
+        if channel_desc is not None:
+            _append_channel(metadata, channel_desc)
+            metadata['channels'] = 1
+    return channel_descriptions
+
+
+def _parse_dimensions(image_description, metadata):
+    dimensions_element = image_description.find('Dimensions')
+    if dimensions_element is None:
+        return
+    for dim_desc in dimensions_element.findall('DimensionDescription'):
+        attrib = dim_desc.attrib
+        dim_id = int(attrib.get('DimID', '0'))
+        num_elements = int(attrib.get('NumberOfElements', '0'))
+        length = float(attrib.get('Length', '0'))
+        bytes_inc = int(attrib.get('BytesInc', '0'))
+        unit = attrib.get('Unit', '')
+        if unit:
+            metadata['resunit'] = unit
+
+        # Compute resolution
+        if num_elements > 1:
+            res = length / (num_elements - 1)
+        else:
+            res = 0
+
+        if dim_id == 1:
+            metadata['xs'] = num_elements
+            metadata['xres'] = res
+            metadata['xbytesinc'] = bytes_inc
+        elif dim_id == 2:
+            metadata['ys'] = num_elements
+            metadata['yres'] = res
+            metadata['ybytesinc'] = bytes_inc
+        elif dim_id == 3:
+            metadata['zs'] = num_elements
+            metadata['zres'] = res
+            metadata['zbytesinc'] = bytes_inc
+        elif dim_id == 4:
+            metadata['ts'] = num_elements
+            metadata['tres'] = res
+            metadata['tbytesinc'] = bytes_inc
+        elif dim_id == 10:
+            metadata['tiles'] = num_elements
+            metadata['tilesbytesinc'] = bytes_inc
+
+
+def _parse_viewer_scaling(viewer_scaling, metadata):
+    """Black and white values per channel."""
+    for csi in viewer_scaling.findall('ChannelScalingInfo'):
+        metadata['blackvalue'].append(float(csi.attrib.get('BlackValue', '0')))
+        metadata['whitevalue'].append(float(csi.attrib.get('WhiteValue', '1')))
+
+
+def _parse_tile_scan_info(tile_scan_info, metadata, columnar=False):
+    metadata['flipx'] = int(tile_scan_info.attrib.get('FlipX', '0'))
+    metadata['flipy'] = int(tile_scan_info.attrib.get('FlipY', '0'))
+    metadata['swapxy'] = int(tile_scan_info.attrib.get('SwapXY', '0'))
+    tiles = tile_scan_info.findall('Tile')
+    if columnar:
+        metadata['tile_positions'] = {
+            'FieldX': [int(tile.attrib.get('FieldX', '0')) for tile in tiles],
+            'FieldY': [int(tile.attrib.get('FieldY', '0')) for tile in tiles],
+            'PosX': [float(tile.attrib.get('PosX', '0')) for tile in tiles],
+            'PosY': [float(tile.attrib.get('PosY', '0')) for tile in tiles],
+        }
+        return
+    tile_positions = metadata['tile_positions']
+    for i, tile in enumerate(tiles):
+        attrib = tile.attrib
+        tile_positions.append({
+            'num': i + 1,
+            'FieldX': int(attrib.get('FieldX', '0')),
+            'FieldY': int(attrib.get('FieldY', '0')),
+            'PosX': float(attrib.get('PosX', '0')),
+            'PosY': float(attrib.get('PosY', '0')),
+        })
+
+
+def tile_positions_to_columns(tile_positions):
+    """
+    Convert tile_positions from a list of per-tile dicts to parallel lists:
+    {'FieldX': [...], 'FieldY': [...], 'PosX': [...], 'PosY': [...]}.
+    The tile number is implied by the list index (num = index + 1).
+    Columnar input is returned as is.
+    """
+    if isinstance(tile_positions, dict):
+        return tile_positions
+    return {
+        field: [tile[field] for tile in tile_positions]
+        for field in TILE_POSITION_FIELDS
+    }
+
+
+def tile_positions_to_records(tile_positions):
+    """
+    Convert columnar tile_positions back to the list of per-tile dicts
+    ({'num', 'FieldX', 'FieldY', 'PosX', 'PosY'}) parse_image_xml returns by
+    default. A list of records is returned as is.
+    """
+    if not isinstance(tile_positions, dict):
+        return tile_positions
+    columns = [tile_positions.get(field, []) for field in TILE_POSITION_FIELDS]
+    return [
+        dict(zip(('num',) + TILE_POSITION_FIELDS, (i + 1,) + values))
+        for i, values in enumerate(zip(*columns))
+    ]
+
+
+def apply_tile_layout(result, columnar=False):
+    """
+    Put the tile_positions of a reader result in the requested layout:
+    columnar (parallel lists) or records (list of per-tile dicts). Works on
+    a single image's metadata and on the images listed in 'children'.
+    Dictionaries are updated in place; the result is returned for chaining.
+    """
+    convert = tile_positions_to_columns if columnar else tile_positions_to_records
+    if 'tile_positions' in result:
+        result['tile_positions'] = convert(result['tile_positions'])
+    for child in result.get('children', ()):
+        if isinstance(child, dict) and 'tile_positions' in child:
+            child['tile_positions'] = convert(child['tile_positions'])
+    return result
+
+
+def _parse_objective(setting, metadata):
+    attributes = setting.attrib
+    metadata['objective'] = attributes.get('ObjectiveName', '')
+    metadata['na'] = float(attributes.get('NumericalAperture', '0'))
+    metadata['refractiveindex'] = float(attributes.get('RefractionIndex', '0'))
+
+
+def _parse_confocal_setting(confocal_setting, metadata):
+    _parse_objective(confocal_setting, metadata)
+    spectro = confocal_setting.find('Spectro')
+    if spectro is not None:
+        for mb in spectro.findall('MultiBand'):
+            left_world = float(mb.attrib.get('LeftWorld', '0'))
+            right_world = float(mb.attrib.get('RightWorld', '0'))
+            emission = left_world + (right_world - left_world) / 2
+            metadata['emission'].append(emission)
+            metadata['excitation'].append(emission - 10)
+
+
+def _parse_camera_setting(camera_setting, metadata):
+    _parse_objective(camera_setting, metadata)
+    wf_channel_config = camera_setting.find('WideFieldChannelConfigurator')
+    if wf_channel_config is None:
+        return
+    for wfci in wf_channel_config.findall('WideFieldChannelInfo'):
+        fluo_cube_name = wfci.attrib.get('FluoCubeName', '')
+        contrast_method_name = wfci.attrib.get('ContrastingMethodName', '')
+        metadata['contrastmethod'].append(contrast_method_name)
+        ex_name = fluo_cube_name
+        if fluo_cube_name == 'QUAD-S':
+            ex_name = wfci.attrib.get('FFW_Excitation1FilterName', '')
+        elif fluo_cube_name == 'DA/FI/TX':
+            ex_name = wfci.attrib.get('LUT', '')
+        metadata['filterblock'].append(f"{fluo_cube_name}: {ex_name}")
+
+        ex_em = EX_EM_WAVELENGTHS.get(ex_name, (0, 0))
+        metadata['excitation'].append(ex_em[0])
+        metadata['emission'].append(ex_em[1])
+
+
+def _parse_stellaris_dyes(channel_descriptions, metadata):
+    for ch_desc in channel_descriptions:
+        for prop in ch_desc.findall('ChannelProperty'):
+            key = prop.find('Key')
+            value = prop.find('Value')
+            if key is not None and key.text.strip() == 'DyeName' and value is not None:
+                metadata['filterblock'].append(value.text.strip())
+                break
+
+
+def _parse_thunder_channels(hardware_setting, metadata):
+    # Grab ALL WideFieldChannelConfigurator blocks
+    for wf_channel_config in hardware_setting.iter('WideFieldChannelConfigurator'):
+        # Skip if it's the HS autofocus instance
+        if wf_channel_config.attrib.get('ThisIsHSAutofocusInstance', '0') == '1':
+            continue
+
+        # Now parse the actual WideFieldChannelInfo blocks
+        for wfci in wf_channel_config.findall('WideFieldChannelInfo'):
+            fluo_cube_name = wfci.attrib.get('FluoCubeName', '')
+            emission_str = wfci.attrib.get('EmissionWavelength', '0')
+            try:
+                emission_val = float(emission_str)
+            except ValueError:
+                emission_val = 0.0
+
+            # Find the highest ILLEDWavelength_i where ILLEDActiveState_i="1"
+            valid_excitation_wavelength = 0.0
+            for i in range(8):
+                active_state = wfci.attrib.get(f'ILLEDActiveState{i}', '0')
+                if active_state == '1':
+                    w_str = wfci.attrib.get(f'ILLEDWavelength{i}', '0')
+                    try:
+                        w_val = float(w_str)
+                    except ValueError:
+                        w_val = 0.0
+                    valid_excitation_wavelength = w_val
+
+            # Append to metadata fields
+            metadata['excitation'].append(valid_excitation_wavelength)
+            metadata['emission'].append(emission_val)
+
+            # Build filterblock as "FluoCubeName + emission"
+            block_label = f"{fluo_cube_name} {int(emission_val)}"
+            metadata['filterblock'].append(block_label)
+
+            # Also store contrast method if wanted
+            contrast_method_name = wfci.attrib.get('ContrastingMethodName', '')
+            metadata['contrastmethod'].append(contrast_method_name)
+
+
+def _parse_hardware_setting(hardware_setting, channel_descriptions, metadata):
+    data_source_type_name = hardware_setting.attrib.get('DataSourceTypeName', '')
+    metadata['mic_type2'] = data_source_type_name.lower()
+    if data_source_type_name == 'Confocal':
+        metadata['mic_type'] = 'IncohConfMicr'
+        confocal_setting = hardware_setting.find('ATLConfocalSettingDefinition')
+        if confocal_setting is not None:
+            _parse_confocal_setting(confocal_setting, metadata)
+    elif data_source_type_name == 'Camera':
+        metadata['mic_type'] = 'IncohWFMicr'
+        camera_setting = hardware_setting.find('ATLCameraSettingDefinition')
+        if camera_setting is not None:
+            _parse_camera_setting(camera_setting, metadata)
+    else:
+        metadata['mic_type'] = 'unknown'
+        metadata['mic_type2'] = 'generic'
+
+    # Handle STELLARIS or AF 6000LX (Thunder)
+    system_type_name = hardware_setting.attrib.get('SystemTypeName', '')
+    if 'STELLARIS' in system_type_name:
+        _parse_stellaris_dyes(channel_descriptions, metadata)
+    elif 'AF 6000LX' in system_type_name:
+        if data_source_type_name == 'Camera':
+            _parse_thunder_channels(hardware_setting, metadata)
+
+
+def parse_image_xml(xml_element, columnar=False, profile='full'):
     """
     Parses the XML element to extract image metadata like pixel sizes,
     dimensions, color LUTs, channel names, etc.
 
+    The element is walked once (see collect_image_nodes) and each attachment
+    is handed to its own parser.
+
+    With columnar=True, tile_positions is stored as parallel lists (see
+    tile_positions_to_columns) instead of one dict per tile, which is much
+    smaller for tile scans with thousands of tiles. The per-channel fields
+    are always parallel lists.
+
+    profile (one of METADATA_PROFILES) selects how much is parsed: 'listing'
+    returns parse_image_summary, 'preview' skips the HardwareSetting
+    attachment and leaves out the keys derived from it (objective, na,
+    refractiveindex, mic_type, mic_type2, filterblock, excitation, emission,
+    contrastmethod), 'full' parses everything.
+
     Returns:
         A dictionary with the extracted metadata.
     """
+    if profile not in METADATA_PROFILES:
+        raise ValueError(f"Unknown metadata profile: {profile}")
+    if profile == 'listing':
+        return parse_image_summary(xml_element)
+    full = profile == 'full'
+
     metadata = {}
     metadata['UniqueID'] = None  # Initialize UniqueID
     metadata['ElementName'] = None
@@ -38,16 +491,20 @@ def parse_image_xml(xml_element):
     metadata['flipx'] = 0
     metadata['flipy'] = 0
     metadata['swapxy'] = 0
-    metadata['tile_positions'] = []
-    metadata['objective'] = ''
-    metadata['na'] = None
-    metadata['refractiveindex'] = None
-    metadata['mic_type'] = ''
-    metadata['mic_type2'] = ''
-    metadata['filterblock'] = []
-    metadata['excitation'] = []
-    metadata['emission'] = []
-    metadata['contrastmethod'] = []
+    if columnar:
+        metadata['tile_positions'] = {field: [] for field in TILE_POSITION_FIELDS}
+    else:
+        metadata['tile_positions'] = []
+    if full:
+        metadata['objective'] = ''
+        metadata['na'] = None
+        metadata['refractiveindex'] = None
+        metadata['mic_type'] = ''
+        metadata['mic_type2'] = ''
+        metadata['filterblock'] = []
+        metadata['excitation'] = []
+        metadata['emission'] = []
+        metadata['contrastmethod'] = []
 
     if xml_element.tag == 'Element':
         metadata['UniqueID'] = xml_element.attrib.get('UniqueID')
@@ -56,272 +513,38 @@ def parse_image_xml(xml_element):
         metadata['UniqueID'] = 'none (LOF)'
         metadata['ElementName'] = 'none (LOF)'
 
-    memory_block = xml_element.find('.//Memory/Block')
+    image_description, memory_block, attachments = collect_image_nodes(
+        xml_element, PROFILE_ATTACHMENTS[profile]
+    )
+
     if memory_block is not None:
         block_file = memory_block.attrib.get('File')
         if block_file and block_file.lower().endswith('.lof'):
             metadata['LOFFile'] = block_file
 
-    # Extract ImageDescription
-    image_description = xml_element.find('.//ImageDescription')
     if image_description is not None:
-        # Extract Channels
-        channels_element = image_description.find('Channels')
-        if channels_element is not None:
-            channel_descriptions = channels_element.findall('ChannelDescription')
-            metadata['channels'] = len(channel_descriptions)
-            if metadata['channels'] > 1:
-                channel_tag = channel_descriptions[0].attrib.get('ChannelTag')
-                if channel_tag and int(channel_tag) != 0:
-                    metadata['isrgb'] = True
-            for channel_desc in channel_descriptions:
-                bytes_inc = channel_desc.attrib.get('BytesInc')
-                resolution = channel_desc.attrib.get('Resolution')
-                lut_name = channel_desc.attrib.get('LUTName')
-                metadata['channelbytesinc'].append(int(bytes_inc) if bytes_inc else None)
-                metadata['channelResolution'].append(int(resolution) if resolution else None)
-                metadata['lutname'].append(lut_name.lower() if lut_name else '')
-        else:
-            # Single channel, handle separately
-            channel_desc = image_description.find('.//ChannelDescription')
-            if channel_desc is not None:
-                bytes_inc = channel_desc.attrib.get('BytesInc')
-                resolution = channel_desc.attrib.get('Resolution')
-                lut_name = channel_desc.attrib.get('LUTName')
-                metadata['channelbytesinc'].append(int(bytes_inc) if bytes_inc else None)
-                metadata['channelResolution'].append(int(resolution) if resolution else None)
-                metadata['lutname'].append(lut_name.lower() if lut_name else '')
-                metadata['channels'] = 1
-
-        # Extract Dimensions
-        dimensions_element = image_description.find('Dimensions')
-        if dimensions_element is not None:
-            dim_descriptions = dimensions_element.findall('DimensionDescription')
-            for dim_desc in dim_descriptions:
-                dim_id = int(dim_desc.attrib.get('DimID', '0'))
-                num_elements = int(dim_desc.attrib.get('NumberOfElements', '0'))
-                length = float(dim_desc.attrib.get('Length', '0'))
-                bytes_inc = int(dim_desc.attrib.get('BytesInc', '0'))
-                unit = dim_desc.attrib.get('Unit', '')
-                if unit:
-                    metadata['resunit'] = unit
-
-                # Compute resolution
-                if num_elements > 1:
-                    res = length / (num_elements - 1)
-                else:
-                    res = 0
+        channel_descriptions = _parse_channels(image_description, metadata)
+        _parse_dimensions(image_description, metadata)
 
-                if dim_id == 1:
-                    metadata['xs'] = num_elements
-                    metadata['xres'] = res
-                    metadata['xbytesinc'] = bytes_inc
-                elif dim_id == 2:
-                    metadata['ys'] = num_elements
-                    metadata['yres'] = res
-                    metadata['ybytesinc'] = bytes_inc
-                elif dim_id == 3:
-                    metadata['zs'] = num_elements
-                    metadata['zres'] = res
-                    metadata['zbytesinc'] = bytes_inc
-                elif dim_id == 4:
-                    metadata['ts'] = num_elements
-                    metadata['tres'] = res
-                    metadata['tbytesinc'] = bytes_inc
-                elif dim_id == 10:
-                    metadata['tiles'] = num_elements
-                    metadata['tilesbytesinc'] = bytes_inc
-
-        # Extract ViewerScaling (black and white values)
-        attachments = xml_element.findall('.//Attachment')
-        viewer_scaling = None
-        for attachment in attachments:
-            if attachment.attrib.get('Name') == 'ViewerScaling':
-                viewer_scaling = attachment
-                break
+        viewer_scaling = attachments.get('ViewerScaling')
         if viewer_scaling is not None:
-            channel_scaling_infos = viewer_scaling.findall('ChannelScalingInfo')
-            if channel_scaling_infos:
-                for csi in channel_scaling_infos:
-                    black_value = float(csi.attrib.get('BlackValue', '0'))
-                    white_value = float(csi.attrib.get('WhiteValue', '1'))
-                    metadata['blackvalue'].append(black_value)
-                    metadata['whitevalue'].append(white_value)
-            else:
-                csi = viewer_scaling.find('ChannelScalingInfo')
-                if csi is not None:
-                    black_value = float(csi.attrib.get('BlackValue', '0'))
-                    white_value = float(csi.attrib.get('WhiteValue', '1'))
-                    metadata['blackvalue'].append(black_value)
-                    metadata['whitevalue'].append(white_value)
+            _parse_viewer_scaling(viewer_scaling, metadata)
         else:
             # Default black/white
-            for _ in range(metadata['channels']):
-                metadata['blackvalue'].append(0)
-                metadata['whitevalue'].append(1)
-
-        # Extract TileScanInfo
-        tile_scan_info = None
-        for attachment in attachments:
-            if attachment.attrib.get('Name') == 'TileScanInfo':
-                tile_scan_info = attachment
-                break
+            metadata['blackvalue'] = [0] * metadata['channels']
+            metadata['whitevalue'] = [1] * metadata['channels']
+
+        tile_scan_info = attachments.get('TileScanInfo')
         if tile_scan_info is not None:
-            metadata['flipx'] = int(tile_scan_info.attrib.get('FlipX', '0'))
-            metadata['flipy'] = int(tile_scan_info.attrib.get('FlipY', '0'))
-            metadata['swapxy'] = int(tile_scan_info.attrib.get('SwapXY', '0'))
-            tiles = tile_scan_info.findall('Tile')
-            for i, tile in enumerate(tiles):
-                tile_info = {
-                    'num': i + 1,
-                    'FieldX': int(tile.attrib.get('FieldX', '0')),
-                    'FieldY': int(tile.attrib.get('FieldY', '0')),
-                    'PosX': float(tile.attrib.get('PosX', '0')),
-                    'PosY': float(tile.attrib.get('PosY', '0')),
-                }
-                metadata['tile_positions'].append(tile_info)
-
-        # Extract HardwareSetting
-        hardware_setting = None
-        for attachment in attachments:
-            if attachment.attrib.get('Name') == 'HardwareSetting':
-                hardware_setting = attachment
-                break
+            _parse_tile_scan_info(tile_scan_info, metadata, columnar)
+
+        hardware_setting = attachments.get('HardwareSetting')
         if hardware_setting is not None:
-            data_source_type_name = hardware_setting.attrib.get('DataSourceTypeName', '')
-            metadata['mic_type2'] = data_source_type_name.lower()
-            if data_source_type_name == 'Confocal':
-                metadata['mic_type'] = 'IncohConfMicr'
-                # Confocal settings
-                confocal_setting = hardware_setting.find('ATLConfocalSettingDefinition')
-                if confocal_setting is not None:
-                    attributes = confocal_setting.attrib
-                    metadata['objective'] = attributes.get('ObjectiveName', '')
-                    metadata['na'] = float(attributes.get('NumericalAperture', '0'))
-                    metadata['refractiveindex'] = float(attributes.get('RefractionIndex', '0'))
-                    spectro = confocal_setting.find('Spectro')
-                    if spectro is not None:
-                        multiband = spectro.findall('MultiBand')
-                        for mb in multiband:
-                            left_world = float(mb.attrib.get('LeftWorld', '0'))
-                            right_world = float(mb.attrib.get('RightWorld', '0'))
-                            emission = left_world + (right_world - left_world) / 2
-                            metadata['emission'].append(emission)
-                            metadata['excitation'].append(emission - 10)
-            elif data_source_type_name == 'Camera':
-                metadata['mic_type'] = 'IncohWFMicr'
-                # Camera settings
-                camera_setting = hardware_setting.find('ATLCameraSettingDefinition')
-                if camera_setting is not None:
-                    attributes = camera_setting.attrib
-                    metadata['objective'] = attributes.get('ObjectiveName', '')
-                    metadata['na'] = float(attributes.get('NumericalAperture', '0'))
-                    metadata['refractiveindex'] = float(attributes.get('RefractionIndex', '0'))
-                    wf_channel_config = camera_setting.find('WideFieldChannelConfigurator')
-                    if wf_channel_config is not None:
-                        wf_channel_infos = wf_channel_config.findall('WideFieldChannelInfo')
-                        for wfci in wf_channel_infos:
-                            fluo_cube_name = wfci.attrib.get('FluoCubeName', '')
-                            contrast_method_name = wfci.attrib.get('ContrastingMethodName', '')
-                            metadata['contrastmethod'].append(contrast_method_name)
-                            ex_name = fluo_cube_name
-                            if fluo_cube_name == 'QUAD-S':
-                                ex_name = wfci.attrib.get('FFW_Excitation1FilterName', '')
-                            elif fluo_cube_name == 'DA/FI/TX':
-                                ex_name = wfci.attrib.get('LUT', '')
-                            metadata['filterblock'].append(f"{fluo_cube_name}: {ex_name}")
-
-                            ex_em_wavelengths = {
-                                'DAPI': (355, 460),
-                                'DAP': (355, 460),
-                                'A': (355, 460),
-                                'Blue': (355, 460),
-                                'L5': (480, 527),
-                                'I5': (480, 527),
-                                'Green': (480, 527),
-                                'FITC': (480, 527),
-                                'N3': (545, 605),
-                                'N2.1': (545, 605),
-                                'TRITC': (545, 605),
-                                '488': (488, 525),
-                                '532': (532, 550),
-                                '642': (642, 670),
-                                'Red': (545, 605),
-                                'Y3': (545, 605),
-                                'I3': (545, 605),
-                                'Y5': (590, 700),
-                            }
-                            ex_em = ex_em_wavelengths.get(ex_name, (0, 0))
-                            metadata['excitation'].append(ex_em[0])
-                            metadata['emission'].append(ex_em[1])
-            else:
-                metadata['mic_type'] = 'unknown'
-                metadata['mic_type2'] = 'generic'
-        else:
+            _parse_hardware_setting(hardware_setting, channel_descriptions, metadata)
+        elif full:
             metadata['mic_type'] = 'unknown'
             metadata['mic_type2'] = 'generic'
 
-        # Handle STELLARIS or AF 6000LX (Thunder)
-        if hardware_setting is not None:
-            system_type_name = hardware_setting.attrib.get('SystemTypeName', '')
-
-            # --- Existing STELLARIS logic ---
-            if 'STELLARIS' in system_type_name:
-                channels_element = image_description.find('Channels')
-                if channels_element is not None:
-                    channel_descriptions = channels_element.findall('ChannelDescription')
-                    for ch_desc in channel_descriptions:
-                        channel_properties = ch_desc.findall('ChannelProperty')
-                        for prop in channel_properties:
-                            key = prop.find('Key')
-                            value = prop.find('Value')
-                            if key is not None and key.text.strip() == 'DyeName' and value is not None:
-                                metadata['filterblock'].append(value.text.strip())
-                                break
-            elif 'AF 6000LX' in system_type_name:
-                if data_source_type_name == 'Camera':
-                    # Grab ALL WideFieldChannelConfigurator blocks
-                    wf_channel_config_list = hardware_setting.findall('.//WideFieldChannelConfigurator')
-                    for wf_channel_config in wf_channel_config_list:
-                        # Skip if it's the HS autofocus instance
-                        if wf_channel_config.attrib.get('ThisIsHSAutofocusInstance', '0') == '1':
-                            continue
-
-                        # Now parse the actual WideFieldChannelInfo blocks
-                        wf_channel_infos = wf_channel_config.findall('WideFieldChannelInfo')
-                        for wfci in wf_channel_infos:
-                            fluo_cube_name = wfci.attrib.get('FluoCubeName', '')
-                            emission_str = wfci.attrib.get('EmissionWavelength', '0')
-                            try:
-                                emission_val = float(emission_str)
-                            except ValueError:
-                                emission_val = 0.0
-
-                            # Find the highest ILLEDWavelength_i where ILLEDActiveState_i="1"
-                            valid_excitation_wavelength = 0.0
-                            for i in range(8):
-                                active_state = wfci.attrib.get(f'ILLEDActiveState{i}', '0')
-                                if active_state == '1':
-                                    w_str = wfci.attrib.get(f'ILLEDWavelength{i}', '0')
-                                    try:
-                                        w_val = float(w_str)
-                                    except ValueError:
-                                        w_val = 0.0
-                                    valid_excitation_wavelength = w_val
-
-                            # Append to metadata fields
-                            metadata['excitation'].append(valid_excitation_wavelength)
-                            metadata['emission'].append(emission_val)
-
-                            # Build filterblock as "FluoCubeName + emission"
-                            block_label = f"{fluo_cube_name} {int(emission_val)}"
-                            metadata['filterblock'].append(block_label)
-
-                            # Also store contrast method if wanted
-                            contrast_method_name = wfci.attrib.get('ContrastingMethodName', '')
-                            metadata['contrastmethod'].append(contrast_method_name)
-
-
     # Convert resolution units to micrometers
     unit = metadata['resunit'].lower()
     if unit in ['meter', 'm']:
@@ -342,11 +565,12 @@ def parse_image_xml(xml_element):
     metadata['resunit2'] = 'micrometer'
 
     # Defaults if empty
-    channels_count = metadata.get('channels', 1)
-    if not metadata['emission']:
-        metadata['emission'] = [500] * channels_count
-    if not metadata['excitation']:
-        metadata['excitation'] = [480] * channels_count
+    if full:
+        channels_count = metadata.get('channels', 1)
+        if not metadata['emission']:
+            metadata['emission'] = [500] * channels_count
+        if not metadata['excitation']:
+            metadata['excitation'] = [480] * channels_count
 
     # Consolidate dimensions
     metadata['dimensions'] = {
@@ -0,0 +1,303 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from .LeicaIndexCache import file_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Default budgets of the two cache tiers, per process (see PreviewCache)
+MEMORY_CACHE_MAX_BYTES = 32 * 1024 * 1024
+DISK_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Age (seconds) after which a temporary preview file is considered left
+# behind by a process that died while writing it
+TEMP_FILE_MAX_AGE = 3600
+
+# Encodings a preview can be stored in: file extension, MIME type and the
+# default quality (1-100) of the lossy ones
+PREVIEW_FORMATS = {
+    "png": {"extension": ".png", "mime_type": "image/png", "quality": None},
+    "webp": {"extension": ".webp", "mime_type": "image/webp", "quality": 80},
+    "jpeg": {"extension": ".jpg", "mime_type": "image/jpeg", "quality": 85},
+}
+PREVIEW_EXTENSIONS = {f["extension"] for f in PREVIEW_FORMATS.values()}
+
+
+def get_preview_cache_folder():
+    """
+    Folder where encoded previews are stored.
+
+    Defaults to a folder in the system temp dir, override with the
+    LEICA_PREVIEW_CACHE_PATH environment variable.
+    """
+    return os.getenv(
+        "LEICA_PREVIEW_CACHE_PATH",
+        os.path.join(tempfile.gettempdir(), "omero_biomero", "leica_preview"),
+    )
+
+
+def preview_source_file(metadata):
+    """
+    Path of the file that holds the pixel data of an image (the LIF file, or
+    the LOF file of a LOF/XLEF image).
+    """
+    if metadata.get("filetype") == ".lif":
+        return metadata["LIFFile"]
+    return metadata["LOFFilePath"]
+
+
+def preview_format(image_format="png", quality=None):
+    """
+    Validate an image format and quality and return them as stored in cache
+    keys: quality falls back to the format's default and is None for PNG.
+    """
+    if image_format not in PREVIEW_FORMATS:
+        raise ValueError(f"Unknown preview format: {image_format}")
+    default_quality = PREVIEW_FORMATS[image_format]["quality"]
+    if default_quality is None:
+        return image_format, None
+    if quality is None:
+        return image_format, default_quality
+    try:
+        quality = int(quality)
+    except (TypeError, ValueError):
+        raise ValueError(f"Preview quality must be an integer: {quality}")
+    if not 1 <= quality <= 100:
+        raise ValueError(f"Preview quality must be between 1 and 100: {quality}")
+    return image_format, quality
+
+
+def preview_cache_key(metadata, preview_height, image_format="png", **options):
+    """
+    Cache key of a preview: a digest of the source file's path, size and
+    mtime, the image UniqueID, the preview height, the image format and any
+    further rendering options, followed by the format's file extension.
+    Rewriting the source file changes the key, so stale previews are never
+    served; they just age out of the cache.
+    """
+    if "UniqueID" not in metadata:
+        raise ValueError("metadata does not contain a UniqueID")
+
+    digest = _preview_digest(
+        preview_source_file(metadata),
+        metadata["UniqueID"],
+        preview_height,
+        dict(options, format=image_format),
+    )
+    return digest + PREVIEW_FORMATS[image_format]["extension"]
+
+
+def preview_etag(file_path, image_uuid, preview_height, **options):
+    """
+    Strong HTTP ETag of the preview of image_uuid in file_path (the LIF, XLEF
+    or LOF file a client browses), built like a cache key from that file's
+    fingerprint, so it can be checked without reading any metadata.
+    """
+    return f'"{_preview_digest(file_path, image_uuid, preview_height, options)}"'
+
+
+def _preview_digest(file_path, image_uuid, preview_height, options):
+    key = {
+        "file": os.path.normcase(os.path.abspath(file_path)),
+        "fingerprint": file_fingerprint(file_path),
+        "uuid": image_uuid,
+        "height": preview_height,
+        "options": options,
+    }
+    encoded = json.dumps(key, sort_keys=True).encode("utf-8")
+    return hashlib.sha1(encoded).hexdigest()
+
+
+class PreviewCache:
+    """
+    Two-tier cache of encoded previews.
+
+    An in-process LRU (memory_max_bytes) sits in front of a folder of preview
+    files (disk_max_bytes). Both tiers keep their entries in an OrderedDict in
+    least-recently-used order with a running byte total, so a lookup, an
+    insert and every eviction are O(1); the disk folder is only listed once,
+    to rebuild the index when the cache is created.
+
+    Each process keeps its own index. Files written by other processes are
+    adopted on first lookup, and files they already evicted are skipped.
+    The disk budget is enforced per process on the files it knows about, so
+    a folder shared by N worker processes can grow to about N times
+    disk_max_bytes; give each a smaller budget when that matters.
+
+    Temporary files left behind by a process that was killed while writing a
+    preview are removed when the disk index is built.
+    """
+
+    def __init__(
+        self,
+        cache_folder,
+        memory_max_bytes=MEMORY_CACHE_MAX_BYTES,
+        disk_max_bytes=DISK_CACHE_MAX_BYTES,
+    ):
+        self.cache_folder = cache_folder
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk = OrderedDict()
+        self._disk_bytes = 0
+        os.makedirs(cache_folder, exist_ok=True)
+        self._load_disk_index()
+
+    def _load_disk_index(self):
+        entries = []
+        stale_before = time.time() - TEMP_FILE_MAX_AGE
+        with os.scandir(self.cache_folder) as it:
+            for entry in it:
+                ext = os.path.splitext(entry.name)[1]
+                if ext == ".tmp" and entry.is_file():
+                    self._remove_stale_temp_file(entry, stale_before)
+                    continue
+                if ext not in PREVIEW_EXTENSIONS or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, entry.name, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+
+    def _remove_stale_temp_file(self, entry, stale_before):
+        # Recent temporary files may still be written by another process
+        try:
+            if entry.stat().st_mtime < stale_before:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove temporary preview {entry.name}: {e}")
+
+    def path(self, key):
+        return os.path.join(self.cache_folder, key)
+
+    def get(self, key):
+        """
+        Return the cached preview bytes for key, or None.
+        """
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                return data
+
+        path = self.get_path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            self._forget_disk(key)
+            return None
+        self._remember(key, data)
+        return data
+
+    def get_path(self, key):
+        """
+        Return the path of the cached preview file for key, or None.
+        """
+        path = self.path(key)
+        with self._lock:
+            if key in self._disk:
+                self._disk.move_to_end(key)
+                if os.path.exists(path):
+                    return path
+                self._drop_disk_entry(key)
+                return None
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return None
+        # Written by another process
+        with self._lock:
+            if key not in self._disk:
+                self._disk[key] = size
+                self._disk_bytes += size
+            self._evict_disk()
+        return path
+
+    def put(self, key, data):
+        """
+        Store preview bytes under key in both tiers and return the file path.
+        The file is written next to its final location and renamed into
+        place, so readers (and other processes) never see a partial preview.
+        """
+        path = self.path(key)
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_folder, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        with self._lock:
+            self._drop_disk_entry(key)
+            self._disk[key] = len(data)
+            self._disk_bytes += len(data)
+            self._evict_disk()
+        self._remember(key, data)
+        return path
+
+    def _remember(self, key, data):
+        if len(data) > self.memory_max_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= len(previous)
+            self._memory[key] = data
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self.memory_max_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def _forget_disk(self, key):
+        with self._lock:
+            self._drop_disk_entry(key)
+
+    def _drop_disk_entry(self, key):
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
+
+    def _evict_disk(self):
+        while self._disk_bytes > self.disk_max_bytes and len(self._disk) > 1:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not evict preview {key}: {e}")
+
+
+_preview_caches = {}
+_preview_caches_lock = threading.Lock()
+
+
+def get_preview_cache(cache_folder, **kwargs):
+    """
+    Return the PreviewCache for cache_folder, shared by all callers in this
+    process so the memory tier survives between requests. kwargs (budgets)
+    only apply when the cache is created.
+    """
+    key = os.path.normcase(os.path.abspath(cache_folder))
+    with _preview_caches_lock:
+        cache = _preview_caches.get(key)
+        if cache is None:
+            cache = PreviewCache(cache_folder, **kwargs)
+            _preview_caches[key] = cache
+        return cache
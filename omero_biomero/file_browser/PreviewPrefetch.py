@@ -0,0 +1,197 @@
+import heapq
+import logging
+import itertools
+import threading
+from collections import namedtuple
+from .ReadLeicaFile import read_leica_file_dict
+from .PreviewCache import get_preview_cache_folder, preview_etag, preview_format
+
+logger = logging.getLogger(__name__)
+
+# Default size of the worker pool and of the queue of pending jobs
+PREFETCH_MAX_WORKERS = 2
+PREFETCH_MAX_PENDING = 512
+
+PrefetchJob = namedtuple(
+    "PrefetchJob", ["file_path", "image_uuid", "preview_height", "image_format", "quality"]
+)
+
+
+class PreviewPrefetcher:
+    """
+    Renders previews into the preview cache in the background, so they are
+    usually cached by the time a client asks for them.
+
+    A bounded pool of worker threads takes jobs from a priority queue (lowest
+    priority first, then in the order they were scheduled). Jobs are
+    deduplicated by the preview they produce, which is identified by the
+    source file's fingerprint, the image and the preview options, so an image
+    is rendered once however many sessions ask for it.
+
+    Jobs belong to sessions. Scheduling a new batch for a session (e.g. when
+    the user opens another folder) or cancelling the session cancels the jobs
+    of its previous batch that have not started yet and are not wanted by
+    another session; running jobs always finish.
+    """
+
+    def __init__(self, max_workers=PREFETCH_MAX_WORKERS, max_pending=PREFETCH_MAX_PENDING):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._heap = []
+        self._order = itertools.count()
+        # job_id -> [job, sessions that want it]; running jobs are kept here
+        # until they finish, so they are not queued twice
+        self._jobs = {}
+        self._running = set()
+        self._sessions = {}
+        self._workers = []
+
+    def schedule(self, session, jobs):
+        """
+        Replace the pending jobs of session by jobs, a list of
+        (priority, PrefetchJob). Returns the number of jobs queued or already
+        pending or running.
+        """
+        with self._lock:
+            self._cancel_locked(session)
+
+            wanted = set()
+            for priority, job in jobs:
+                if len(self._jobs) >= self.max_pending:
+                    logger.debug("Preview prefetch queue is full, dropping jobs")
+                    break
+                try:
+                    job_id = _job_id(job)
+                except (OSError, ValueError) as e:
+                    logger.debug(f"Not prefetching {job.file_path}#{job.image_uuid}: {e}")
+                    continue
+                entry = self._jobs.get(job_id)
+                if entry is None:
+                    entry = self._jobs[job_id] = [job, set()]
+                # Higher priority requests move queued jobs forward; the
+                # stale heap entry is skipped when it comes up
+                heapq.heappush(self._heap, (priority, next(self._order), job_id))
+                entry[1].add(session)
+                wanted.add(job_id)
+
+            if wanted:
+                self._sessions[session] = wanted
+            self._start_workers_locked()
+            return len(wanted)
+
+    def cancel(self, session):
+        """
+        Cancel the jobs of session that have not started yet.
+        """
+        with self._lock:
+            self._cancel_locked(session)
+
+    def pending(self):
+        """
+        Number of jobs that are queued or running.
+        """
+        with self._lock:
+            return len(self._jobs)
+
+    def _cancel_locked(self, session):
+        for job_id in self._sessions.pop(session, ()):
+            entry = self._jobs.get(job_id)
+            if entry is None:
+                continue
+            entry[1].discard(session)
+            if not entry[1] and job_id not in self._running:
+                del self._jobs[job_id]
+        if not self._jobs:
+            # Only stale entries are left, drop them rather than let the heap
+            # grow with every cancelled batch
+            self._heap.clear()
+
+    def _start_workers_locked(self):
+        self._workers = [worker for worker in self._workers if worker.is_alive()]
+        while len(self._workers) < min(self.max_workers, len(self._jobs)):
+            worker = threading.Thread(
+                target=self._work, name="preview-prefetch", daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def _next_job_locked(self):
+        while self._heap:
+            _, _, job_id = heapq.heappop(self._heap)
+            if job_id in self._jobs and job_id not in self._running:
+                self._running.add(job_id)
+                return job_id, self._jobs[job_id][0]
+        return None, None
+
+    def _work(self):
+        while True:
+            with self._lock:
+                job_id, job = self._next_job_locked()
+                if job is None:
+                    # Idle workers exit; schedule starts new ones
+                    self._workers.remove(threading.current_thread())
+                    return
+            try:
+                _render(job)
+            except Exception as e:
+                logger.warning(
+                    f"Could not prefetch preview of {job.file_path}#{job.image_uuid}: {e}"
+                )
+            finally:
+                with self._lock:
+                    self._running.discard(job_id)
+                    entry = self._jobs.pop(job_id, None)
+                    for session in entry[1] if entry else ():
+                        wanted = self._sessions.get(session)
+                        if wanted is not None:
+                            wanted.discard(job_id)
+                            if not wanted:
+                                del self._sessions[session]
+
+
+def _job_id(job):
+    image_format, quality = preview_format(job.image_format, job.quality)
+    return preview_etag(
+        job.file_path,
+        job.image_uuid,
+        job.preview_height,
+        format=image_format,
+        quality=quality,
+    )
+
+
+def _render(job):
+    # Imported here, so scheduling does not need numpy and OpenCV
+    from .CreatePreview import PREVIEW_PYRAMID_HEIGHTS, create_preview_image
+
+    metadata = read_leica_file_dict(
+        job.file_path, image_uuid=job.image_uuid, profile="preview"
+    )
+    # Only cache the levels up to the prefetched height, so large levels
+    # nobody asked for do not push previews out of the cache
+    create_preview_image(
+        metadata,
+        get_preview_cache_folder(),
+        preview_height=job.preview_height,
+        image_format=job.image_format,
+        quality=job.quality,
+        pyramid_heights=[
+            height for height in PREVIEW_PYRAMID_HEIGHTS if height <= job.preview_height
+        ],
+    )
+
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_preview_prefetcher():
+    """
+    Return the PreviewPrefetcher shared by all requests in this process.
+    """
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = PreviewPrefetcher()
+        return _prefetcher
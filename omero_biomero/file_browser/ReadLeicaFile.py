@@ -1,11 +1,30 @@
 import os
-from .ReadLeicaLIF import read_leica_lif
-from .ReadLeicaXLEF import read_leica_xlef
-from .ReadLeicaLOF import read_leica_lof
+import json
+from .ReadLeicaLIF import read_leica_lif_dict
+from .ReadLeicaXLEF import read_leica_xlef_dict
+from .ReadLeicaLOF import read_leica_lof_dict
 
 
-def read_leica_file(
-    file_path, include_xmlelement=False, image_uuid=None, folder_uuid=None
+def read_leica_file(file_path, *args, **kwargs):
+    """
+    Read Leica LIF, XLEF, or LOF file, see read_leica_file_dict.
+
+    Returns:
+    - The result of read_leica_file_dict, serialized as a JSON string.
+    """
+    return json.dumps(read_leica_file_dict(file_path, *args, **kwargs), indent=2)
+
+
+def read_leica_file_dict(
+    file_path,
+    include_xmlelement=False,
+    image_uuid=None,
+    folder_uuid=None,
+    streaming=False,
+    profile="full",
+    max_workers=None,
+    timeout=None,
+    columnar=False,
 ):
     """
     Read Leica LIF, XLEF, or LOF file.
@@ -15,23 +34,44 @@ def read_leica_file(
     - include_xmlelement: whether to include the XML element in the lifinfo dictionary
     - image_uuid: optional UUID of an image
     - folder_uuid: optional UUID of a folder/collection
+    - streaming: parse the LIF XML header incrementally and stop as soon as the
+      requested image/folder is complete (LIF only)
+    - profile: how much image metadata to parse, see parse_image_xml:
+      "listing" (name, UUID and dimensions), "preview" (also channels, strides,
+      scaling and tile positions) or "full" (also hardware settings)
+    - max_workers: read the metadata of listed children with a thread pool of this
+      size (XLEF only)
+    - timeout: seconds to wait for each child file when max_workers is set (XLEF only)
+    - columnar: return tile positions as parallel lists ({"FieldX": [...],
+      "FieldY": [...], "PosX": [...], "PosY": [...]}) instead of one dictionary
+      per tile
 
-    Returns:
+    Returns (as plain Python structures, nothing is serialized):
     - If image_uuid is provided:
         - Returns the lifinfo dictionary for the matching image, including detailed metadata.
     - Else if folder_uuid is provided:
-        - Returns a single-level XML tree (as a string) of that folder (its immediate children only).
+        - Returns a single-level tree (as a dictionary) of that folder (its immediate children only).
     - Else (no image_uuid or folder_uuid):
-        - Returns a single-level XML tree (as a string) of the root/top-level folder(s) or items.
+        - Returns a single-level tree (as a dictionary) of the root/top-level folder(s) or items.
     """
     _, ext = os.path.splitext(file_path)
     ext = ext.lower()
 
     if ext == ".lif":
-        return read_leica_lif(file_path, include_xmlelement, image_uuid, folder_uuid)
+        return read_leica_lif_dict(
+            file_path,
+            include_xmlelement,
+            image_uuid,
+            folder_uuid,
+            streaming=streaming,
+            profile=profile,
+            columnar=columnar,
+        )
     elif ext == ".xlef":
-        return read_leica_xlef(file_path, folder_uuid)
+        return read_leica_xlef_dict(
+            file_path, folder_uuid, max_workers, timeout, columnar, profile
+        )
     elif ext == ".lof":
-        return read_leica_lof(file_path, include_xmlelement)
+        return read_leica_lof_dict(file_path, include_xmlelement, columnar, profile)
     else:
         raise ValueError("Unsupported file type: {}".format(ext))
@@ -1,8 +1,17 @@
 import os
 import json
+import mmap
+import codecs
 import struct
-import xml.etree.ElementTree as ET
-from .ParseLeicaImageXML import parse_image_xml
+import logging
+import threading
+from array import array
+from collections import namedtuple
+from .ParseLeicaImageXML import METADATA_PROFILES, apply_tile_layout, parse_image_xml
+from .LeicaIndexCache import file_fingerprint, load_index, save_index
+from .LeicaXMLBackend import xml_fromstring, xml_pull_parser, xml_tostring
+
+logger = logging.getLogger(__name__)
 
 
 def build_single_level_image_node(lifinfo, lif_base_name, parent_path):
@@ -107,15 +116,23 @@ def build_single_level_lif_folder_node(
     return node
 
 
-import os
-import json
-import struct
-import xml.etree.ElementTree as ET
-from .ParseLeicaImageXML import parse_image_xml
-
-
-def read_leica_lif(
-    file_path, include_xmlelement=False, image_uuid=None, folder_uuid=None
+def read_leica_lif(file_path, *args, **kwargs):
+    """
+    Read Leica LIF file and return the result of read_leica_lif_dict as a
+    JSON string.
+    """
+    return json.dumps(read_leica_lif_dict(file_path, *args, **kwargs), indent=2)
+
+
+def read_leica_lif_dict(
+    file_path,
+    include_xmlelement=False,
+    image_uuid=None,
+    folder_uuid=None,
+    use_index=True,
+    streaming=False,
+    profile="full",
+    columnar=False,
 ):
     """
     Read Leica LIF file, extracting folder and image structures.
@@ -123,67 +140,251 @@ def read_leica_lif(
       - When no folder_uuid is provided: return the root and its first-level children.
       - When a folder_uuid is provided: return only that folder and its first-level children.
       - Correctly builds 'save_child_name' using the LIF base name and full folder path.
+
+    The parsed structure is cached on disk (see LeicaIndexCache) and reused
+    until the size or mtime of the LIF file changes, so browsing a LIF only
+    parses its XML header once. Set use_index=False to always parse the file.
+    When the index is missing, a request for one image only streams the
+    header up to that image, and the index is built in the background.
+
+    With streaming=True the XML header is parsed incrementally instead of
+    being decoded and built into one ElementTree, and parsing stops as soon
+    as the requested image or folder is complete (see stream_lif_index).
+
+    profile selects how much image metadata is parsed (see parse_image_xml):
+    "listing" only extracts the name, UUID and dimensions of every image,
+    which is all a folder listing needs, "preview" skips the hardware
+    settings, "full" parses everything. Each profile has its own cached
+    index.
+
+    Tile positions are always parsed, and cached, in the columnar layout (see
+    parse_image_xml). They are returned as parallel lists with columnar=True,
+    otherwise as the original list of per-tile dictionaries.
+
+    Returns plain Python structures (dictionaries and lists).
+    """
+    if profile not in METADATA_PROFILES:
+        raise ValueError(f"Unknown metadata profile: {profile}")
+
+    kind = "lif" if profile == "full" else f"lif_{profile}"
+    if use_index and not include_xmlelement:
+        fingerprint = file_fingerprint(file_path)
+        index = load_index(kind, file_path, fingerprint)
+        if index is None:
+            if streaming or image_uuid is not None:
+                index = stream_lif_index(
+                    file_path,
+                    image_uuid=image_uuid,
+                    folder_uuid=folder_uuid,
+                    profile=profile,
+                )
+            else:
+                index = build_lif_index(file_path, profile=profile)
+            # A streamed lookup of one image/folder only yields a partial index
+            if image_uuid is None and (not streaming or folder_uuid is None):
+                save_index(kind, file_path, fingerprint, index)
+            elif image_uuid is not None:
+                build_lif_index_in_background(file_path, profile)
+    elif streaming:
+        index = stream_lif_index(
+            file_path, include_xmlelement, image_uuid, folder_uuid, profile=profile
+        )
+    else:
+        # Raw XML elements are too large to be worth caching
+        index = build_lif_index(file_path, include_xmlelement, profile)
+
+    result = lookup_lif_index(index, file_path, image_uuid, folder_uuid)
+    return apply_tile_layout(result, columnar)
+
+
+_background_builds = set()
+_background_builds_lock = threading.Lock()
+
+
+def build_lif_index_in_background(file_path, profile="full"):
+    """
+    Build and save the index of file_path for profile in a background thread,
+    unless a build of it is already running.
+    """
+    kind = "lif" if profile == "full" else f"lif_{profile}"
+    key = (kind, os.path.normcase(os.path.abspath(file_path)))
+    with _background_builds_lock:
+        if key in _background_builds:
+            return
+        _background_builds.add(key)
+
+    def build():
+        try:
+            fingerprint = file_fingerprint(file_path)
+            index = build_lif_index(file_path, profile=profile)
+            save_index(kind, file_path, fingerprint, index)
+        except Exception as e:
+            logger.warning(f"Could not index {file_path}: {e}")
+        finally:
+            with _background_builds_lock:
+                _background_builds.discard(key)
+
+    threading.Thread(target=build, name="lif-index", daemon=True).start()
+
+
+def read_lif_header(f, file_path):
+    """
+    Validate the LIF file header and return the length (in UTF-16 characters)
+    of the XML description that follows it.
+    """
+    testvalue = struct.unpack("i", f.read(4))[0]
+    if testvalue != 112:
+        raise ValueError(f"Error Opening LIF-File: {file_path}")
+    _ = struct.unpack("i", f.read(4))[0]  # XMLContentLength
+    testvalue = struct.unpack("B", f.read(1))[0]
+    if testvalue != 42:
+        raise ValueError(f"Error Opening LIF-File: {file_path}")
+    return struct.unpack("i", f.read(4))[0]
+
+
+# SNextBlock header of a memory block: test value (112), content length,
+# separator (42), memory size, separator (42), BlockID length (UTF-16 chars)
+_BLOCK_HEADER = struct.Struct("<iiBqBi")
+
+LifBlockTable = namedtuple("LifBlockTable", ["block_ids", "sizes", "positions"])
+
+
+def scan_lif_blocks(f, offset, file_path):
+    """
+    Scan the memory block table of an open LIF file, starting at offset
+    (directly after the XML description).
+
+    The file is memory-mapped and every block header is decoded with a single
+    struct.unpack_from, so scanning costs one page access per block instead of
+    several small reads and a seek.
+
+    Returns a LifBlockTable of parallel sequences: block_ids (list of str),
+    sizes and positions (array('q')), where position is the file offset of
+    the block's pixel data.
+    """
+    block_ids = []
+    sizes = array("q")
+    positions = array("q")
+
+    file_size = os.fstat(f.fileno()).st_size
+    if file_size <= offset:
+        return LifBlockTable(block_ids, sizes, positions)
+
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pos = offset
+        while pos < file_size:
+            if pos + _BLOCK_HEADER.size > file_size:
+                raise ValueError("Error Opening LIF-File: {}".format(file_path))
+            testvalue, _, sep1, MemorySize, sep2, BlockIDLength = (
+                _BLOCK_HEADER.unpack_from(mm, pos)
+            )
+            if testvalue != 112 or sep1 != 42 or sep2 != 42:
+                raise ValueError("Error Opening LIF-File: {}".format(file_path))
+            id_start = pos + _BLOCK_HEADER.size
+            position = id_start + BlockIDLength * 2
+            block_ids.append(mm[id_start:position].decode("utf-16"))
+            sizes.append(MemorySize)
+            positions.append(position)
+            pos = position + max(MemorySize, 0)
+
+    return LifBlockTable(block_ids, sizes, positions)
+
+
+def _lif_block_lookup(block_table, file_path):
+    """
+    Map BlockID -> block info dictionary for every block in a LifBlockTable.
+    """
+    return {
+        block_id: {
+            "BlockID": block_id,
+            "MemorySize": size,
+            "Position": position,
+            "LIFFile": file_path,
+        }
+        for block_id, size, position in zip(
+            block_table.block_ids, block_table.sizes, block_table.positions
+        )
+    }
+
+
+def _lif_image_block(element, blockid_to_lifinfo):
+    """
+    Return the memory block of an image element, or None if the element is
+    a folder (no Memory, or no valid memory reference).
+    """
+    Memory = element.find("Memory")
+    if Memory is None:
+        return None
+    MemoryBlockID = Memory.attrib.get("MemoryBlockID")
+    MemorySize = int(Memory.attrib.get("Size", "0"))
+    if MemoryBlockID and MemorySize > 0 and MemoryBlockID in blockid_to_lifinfo:
+        return blockid_to_lifinfo[MemoryBlockID]
+    return None
+
+
+def _build_lif_image(
+    element, lif_block, save_child_name, include_xmlelement, profile="full"
+):
+    lif_block["name"] = element.attrib.get("Name", "")
+    lif_block["uuid"] = element.attrib.get("UniqueID")
+    lif_block["filetype"] = ".lif"
+    lif_block["datatype"] = "Image"
+
+    if include_xmlelement:
+        lif_block["xmlElement"] = xml_tostring(element)
+
+    metadata = parse_image_xml(element, columnar=True, profile=profile)
+    lif_block.update(metadata)
+
+    lif_block["save_child_name"] = save_child_name
+    return lif_block
+
+
+def build_lif_index(file_path, include_xmlelement=False, profile="full"):
+    """
+    Parse a LIF file into a JSON-serializable index:
+      - image_map: image UUID -> image metadata (block info + parse_image_xml
+        for the given profile, with columnar tile positions)
+      - folder_map: folder UUID -> {"name": ..., "children": [child UUIDs]}
+      - parent_map: UUID -> parent folder UUID (None for the root level)
     """
     lif_base_name = os.path.splitext(os.path.basename(file_path))[
         0
     ]  # Extract the LIF file base name
 
     with open(file_path, "rb") as f:
-        # Basic LIF validation
-        testvalue = struct.unpack("i", f.read(4))[0]
-        if testvalue != 112:
-            raise ValueError(f"Error Opening LIF-File: {file_path}")
-        _ = struct.unpack("i", f.read(4))[0]  # XMLContentLength
-        testvalue = struct.unpack("B", f.read(1))[0]
-        if testvalue != 42:
-            raise ValueError(f"Error Opening LIF-File: {file_path}")
-        testvalue = struct.unpack("i", f.read(4))[0]
-        XMLObjDescriptionUTF16 = f.read(testvalue * 2)
+        xml_length = read_lif_header(f, file_path)
+        XMLObjDescriptionUTF16 = f.read(xml_length * 2)
         XMLObjDescription = XMLObjDescriptionUTF16.decode("utf-16")
 
-        xml_root = ET.fromstring(XMLObjDescription)
+        xml_root = xml_fromstring(XMLObjDescription)
 
         # Read memory blocks
-        lifinfo_blocks = []
-        while True:
-            data = f.read(4)
-            if not data:
-                break
-            testvalue = struct.unpack("i", data)[0]
-            if testvalue != 112:
-                raise ValueError("Error Opening LIF-File: {}".format(file_path))
-            _ = struct.unpack("i", f.read(4))[0]  # BinContentLength
-            testvalue = struct.unpack("B", f.read(1))[0]
-            if testvalue != 42:
-                raise ValueError("Error Opening LIF-File: {}".format(file_path))
-            MemorySize = struct.unpack("q", f.read(8))[0]
-            testvalue = struct.unpack("B", f.read(1))[0]
-            if testvalue != 42:
-                raise ValueError("Error Opening LIF-File: {}".format(file_path))
-            testvalue = struct.unpack("i", f.read(4))[0]
-            BlockIDLength = testvalue
-            BlockIDData = f.read(BlockIDLength * 2)
-            BlockID = BlockIDData.decode("utf-16")
-            position = f.tell()
-            lifinfo_blocks.append(
-                {
-                    "BlockID": BlockID,
-                    "MemorySize": MemorySize,
-                    "Position": position,
-                    "LIFFile": file_path,
-                }
-            )
-            if MemorySize > 0:
-                f.seek(MemorySize, os.SEEK_CUR)
+        block_table = scan_lif_blocks(f, f.tell(), file_path)
 
     # Create a lookup for blocks by their BlockID
-    blockid_to_lifinfo = {block["BlockID"]: block for block in lifinfo_blocks}
+    blockid_to_lifinfo = _lif_block_lookup(block_table, file_path)
 
     # Initialize storage for images, folders, and parent relationships
     image_map = {}
     folder_map = {}
     parent_map = {}
 
+    def add_folder(element, unique_id, parent_folder_uuid):
+        children = element.find("Children")
+        folder_map[unique_id] = {
+            "name": element.attrib.get("Name", ""),
+            "children": (
+                [
+                    child_el.attrib.get("UniqueID")
+                    for child_el in children.findall("Element")
+                ]
+                if children is not None
+                else []
+            ),
+        }
+        parent_map[unique_id] = parent_folder_uuid
+
     def dfs_collect(
         element, parent_folder_uuid=None, parent_path="", skip_first_level=False
     ):
@@ -194,7 +395,6 @@ def read_leica_lif(
         """
         name = element.attrib.get("Name", "")
         unique_id = element.attrib.get("UniqueID")
-        Memory = element.find("Memory")
 
         # If this is the first element, ignore it and process its children instead
         if skip_first_level:
@@ -214,39 +414,20 @@ def read_leica_lif(
             f"{parent_path}_{name}" if parent_path else name
         )  # Ensures first folder level is captured
 
-        if Memory is not None:
-            MemoryBlockID = Memory.attrib.get("MemoryBlockID")
-            MemorySize = int(Memory.attrib.get("Size", "0"))
-            if MemoryBlockID and MemorySize > 0 and MemoryBlockID in blockid_to_lifinfo:
-                # It's an image
-                lif_block = blockid_to_lifinfo[MemoryBlockID]
-                lif_block["name"] = name
-                lif_block["uuid"] = unique_id
-                lif_block["filetype"] = ".lif"
-                lif_block["datatype"] = "Image"
-
-                if include_xmlelement:
-                    lif_block["xmlElement"] = ET.tostring(
-                        element, encoding="utf-8"
-                    ).decode("utf-8")
-
-                metadata = parse_image_xml(element)
-                lif_block.update(metadata)
-
-                # Construct `save_child_name` correctly
-                save_child_name = f"{lif_base_name}_{current_path}"
-
-                lif_block["save_child_name"] = save_child_name
-                image_map[unique_id] = lif_block
-                parent_map[unique_id] = parent_folder_uuid
-            else:
-                # Folder without valid memory reference
-                folder_map[unique_id] = element
-                parent_map[unique_id] = parent_folder_uuid
-        else:
-            # It's a folder
-            folder_map[unique_id] = element
+        lif_block = _lif_image_block(element, blockid_to_lifinfo)
+        if lif_block is not None:
+            # It's an image
+            image_map[unique_id] = _build_lif_image(
+                element,
+                lif_block,
+                f"{lif_base_name}_{current_path}",
+                include_xmlelement,
+                profile,
+            )
             parent_map[unique_id] = parent_folder_uuid
+        else:
+            # It's a folder (no Memory, or no valid memory reference)
+            add_folder(element, unique_id, parent_folder_uuid)
 
         # Recurse only if this is a folder
         children = element.find("Children")
@@ -261,12 +442,166 @@ def read_leica_lif(
     if root_element is not None:
         dfs_collect(root_element, skip_first_level=True)
 
+    return {"image_map": image_map, "folder_map": folder_map, "parent_map": parent_map}
+
+
+def stream_lif_index(
+    file_path,
+    include_xmlelement=False,
+    image_uuid=None,
+    folder_uuid=None,
+    profile="full",
+    chunk_size=1 << 20,
+):
+    """
+    Build a LIF index (see build_lif_index) by feeding the UTF-16 XML header
+    to an incremental parser, chunk by chunk.
+
+    Every image/folder element is processed as soon as it is complete and
+    then dropped from the tree, so memory stays bounded by the largest single
+    element instead of the whole header. When image_uuid or folder_uuid is
+    given, only the requested image (or the folder's direct children) is run
+    through parse_image_xml and parsing stops as soon as that element has
+    been closed; the returned index is then partial and should not be cached.
+    Images are parsed with the given metadata profile (see parse_image_xml).
+    """
+    lif_base_name = os.path.splitext(os.path.basename(file_path))[0]
+
+    image_map = {}
+    folder_map = {}
+    parent_map = {}
+
+    target_uuid = image_uuid if image_uuid is not None else folder_uuid
+
+    def wanted(frame):
+        if image_uuid is not None:
+            return frame["uuid"] == image_uuid
+        if folder_uuid is not None:
+            return frame["parent"] == folder_uuid
+        return True
+
+    with open(file_path, "rb") as f:
+        xml_length = read_lif_header(f, file_path)
+        xml_offset = f.tell()
+
+        # The block table follows the XML header, but positions are needed
+        # while streaming it, so read the blocks first.
+        blockid_to_lifinfo = _lif_block_lookup(
+            scan_lif_blocks(f, xml_offset + xml_length * 2, file_path), file_path
+        )
+
+        # LIF headers are little-endian UTF-16, normally without a BOM
+        decoder = codecs.getincrementaldecoder("utf-16-le")()
+        parser = xml_pull_parser(events=("start", "end"))
+
+        # One entry per open XML element: (element, frame). Frames are only
+        # set for the wrapper and for the folder/image elements below it.
+        stack = []
+        wrapper_seen = False
+        done = False
+        remaining = xml_length * 2
+
+        while remaining > 0 and not done:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            first_chunk = remaining == xml_length * 2
+            remaining -= len(chunk)
+            if first_chunk:
+                if chunk.startswith(codecs.BOM_UTF16_BE):
+                    decoder = codecs.getincrementaldecoder("utf-16-be")()
+                if chunk.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+                    chunk = chunk[2:]
+            parser.feed(decoder.decode(chunk, final=remaining <= 0))
+
+            for event, element in parser.read_events():
+                if event == "start":
+                    frame = None
+                    if element.tag == "Element":
+                        if not wrapper_seen and len(stack) == 1:
+                            # The first-level wrapper `<Element>` is skipped,
+                            # its children are the root level
+                            wrapper_seen = True
+                            frame = {"uuid": None, "path": "", "children": []}
+                        elif (
+                            len(stack) >= 2
+                            and stack[-1][0].tag == "Children"
+                            and stack[-2][1] is not None
+                            and _lif_image_block(stack[-2][0], blockid_to_lifinfo)
+                            is None
+                        ):
+                            parent_frame = stack[-2][1]
+                            name = element.attrib.get("Name", "")
+                            unique_id = element.attrib.get("UniqueID")
+                            parent_frame["children"].append(unique_id)
+                            frame = {
+                                "uuid": unique_id,
+                                "name": name,
+                                "parent": parent_frame["uuid"],
+                                "path": (
+                                    f"{parent_frame['path']}_{name}"
+                                    if parent_frame["path"]
+                                    else name
+                                ),
+                                "children": [],
+                            }
+                    stack.append((element, frame))
+                    continue
+
+                element, frame = stack.pop()
+                if frame is None:
+                    continue
+                if "parent" not in frame:
+                    # Wrapper closed: the whole root level has been collected
+                    done = True
+                    break
+
+                unique_id = frame["uuid"]
+                lif_block = _lif_image_block(element, blockid_to_lifinfo)
+                if lif_block is not None:
+                    if wanted(frame):
+                        image_map[unique_id] = _build_lif_image(
+                            element,
+                            lif_block,
+                            f"{lif_base_name}_{frame['path']}",
+                            include_xmlelement,
+                            profile,
+                        )
+                        parent_map[unique_id] = frame["parent"]
+                else:
+                    folder_map[unique_id] = {
+                        "name": frame["name"],
+                        "children": frame["children"],
+                    }
+                    parent_map[unique_id] = frame["parent"]
+
+                # Drop the processed element so the tree does not grow
+                stack[-1][0].remove(element)
+
+                if target_uuid is not None and unique_id == target_uuid:
+                    done = True
+                    break
+
+        if not done:
+            parser.close()
+
+    return {"image_map": image_map, "folder_map": folder_map, "parent_map": parent_map}
+
+
+def lookup_lif_index(index, file_path, image_uuid=None, folder_uuid=None):
+    """
+    Build the read_leica_lif result (as a dictionary) from a LIF index.
+    """
+    image_map = index["image_map"]
+    folder_map = index["folder_map"]
+    parent_map = index["parent_map"]
+
     # --------------------------------------------------------------------------
     # If user requested an image by UUID
     # --------------------------------------------------------------------------
     if image_uuid is not None:
         if image_uuid in image_map:
-            return json.dumps(image_map[image_uuid], indent=2)
+            return image_map[image_uuid]
         else:
             raise ValueError(f"Image with UUID {image_uuid} not found")
 
@@ -277,34 +612,29 @@ def read_leica_lif(
         if folder_uuid not in folder_map:
             raise ValueError(f"Folder with UUID {folder_uuid} not found")
 
-        folder_el = folder_map[folder_uuid]
+        folder = folder_map[folder_uuid]
         node = {
             "type": "Folder",
-            "name": folder_el.attrib.get("Name", ""),
+            "name": folder["name"],
             "uuid": folder_uuid,
             "children": [],
         }
 
         # Add only first-level children (folders and images)
-        children = folder_el.find("Children")
-        if children is not None:
-            for child_el in children.findall("Element"):
-                child_name = child_el.attrib.get("Name", "")
-                child_uuid = child_el.attrib.get("UniqueID")
-
-                if child_uuid in image_map:
-                    node["children"].append(image_map[child_uuid])
-                elif child_uuid in folder_map:
-                    node["children"].append(
-                        {
-                            "type": "Folder",
-                            "name": child_name,
-                            "uuid": child_uuid,
-                            "children": [],
-                        }
-                    )
-
-        return json.dumps(node, indent=2)
+        for child_uuid in folder["children"]:
+            if child_uuid in image_map:
+                node["children"].append(image_map[child_uuid])
+            elif child_uuid in folder_map:
+                node["children"].append(
+                    {
+                        "type": "Folder",
+                        "name": folder_map[child_uuid]["name"],
+                        "uuid": child_uuid,
+                        "children": [],
+                    }
+                )
+
+        return node
 
     # --------------------------------------------------------------------------
     # Otherwise return root-level structure (only first-level children)
@@ -316,11 +646,10 @@ def read_leica_lif(
     top_images = [iid for iid in image_map if parent_map[iid] is None]
 
     for f_id in top_folders:
-        f_el = folder_map[f_id]
         node["children"].append(
             {
                 "type": "Folder",
-                "name": f_el.attrib.get("Name", ""),
+                "name": folder_map[f_id]["name"],
                 "uuid": f_id,
                 "children": [],
             }
@@ -329,4 +658,4 @@ def read_leica_lif(
     for i_id in top_images:
         node["children"].append(image_map[i_id])
 
-    return json.dumps(node, indent=2)
+    return node
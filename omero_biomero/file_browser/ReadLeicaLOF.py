@@ -2,11 +2,27 @@ import os
 import uuid
 import json
 import struct
-import xml.etree.ElementTree as ET
 from .ParseLeicaImageXML import parse_image_xml
+from .LeicaXMLBackend import xml_fromstring
 
 
-def read_leica_lof(lof_file_path, include_xmlelement=False):
+def read_leica_lof(
+    lof_file_path, include_xmlelement=False, columnar=False, profile="full"
+):
+    """
+    Reads a Leica LOF file, see read_leica_lof_dict.
+
+    :return: The dictionary from read_leica_lof_dict(...) as a JSON string.
+    """
+    return json.dumps(
+        read_leica_lof_dict(lof_file_path, include_xmlelement, columnar, profile),
+        indent=2,
+    )
+
+
+def read_leica_lof_dict(
+    lof_file_path, include_xmlelement=False, columnar=False, profile="full"
+):
     """
     Reads a Leica LOF file and returns ONLY the dictionary from parse_image_xml.
 
@@ -16,60 +32,15 @@ def read_leica_lof(lof_file_path, include_xmlelement=False):
 
     :param lof_file_path: Path to the .lof file.
     :param include_xmlelement: If True, embed the raw XML in the returned dictionary.
+    :param columnar: If True, return tile positions as parallel lists.
+    :param profile: Metadata profile ("listing", "preview" or "full"), see
+        parse_image_xml.
     :return: A dictionary from parse_image_xml(...).
     """
     with open(lof_file_path, "rb") as f:
         # 1) Read the first SNextBlock (8 bytes)
-        testvalue_bytes = f.read(4)
-        if len(testvalue_bytes) < 4:
-            raise ValueError(f"Error reading LOF file (first 4 bytes): {lof_file_path}")
-        testvalue = struct.unpack("<i", testvalue_bytes)[0]
-        if testvalue != 0x70:
-            raise ValueError(
-                f"Invalid LOF file format (expected 0x70): {lof_file_path}"
-            )
-
-        length_bytes = f.read(4)
-        if len(length_bytes) < 4:
-            raise ValueError(f"Error reading LOF file (length field): {lof_file_path}")
-        length = struct.unpack("<i", length_bytes)[0]
-
-        pHeader = f.read(length)
-        if len(pHeader) < length:
-            raise ValueError(
-                f"Error reading LOF file (pHeader too short): {lof_file_path}"
-            )
-
-        # The first byte should be 0x2A
-        test = struct.unpack("<B", pHeader[:1])[0]
-        if test != 0x2A:
-            raise ValueError(
-                f"Invalid LOF file format (first block not 0x2A): {lof_file_path}"
-            )
-
-        # Skip the first XML chunk we don't usually need
-        text_length = struct.unpack("<i", pHeader[1:5])[0]
-        offset = 5 + text_length * 2
-        if offset > len(pHeader):
-            raise ValueError(
-                f"Error reading LOF file (xml_bytes_header too short): {lof_file_path}"
-            )
-
-        # Skip major version info
-        if offset + 5 > len(pHeader):
-            raise ValueError("Invalid LOF file (truncated major version info).")
-        offset += 5
-
-        # Skip minor version info
-        if offset + 5 > len(pHeader):
-            raise ValueError("Invalid LOF file (truncated minor version info).")
-        offset += 5
-
-        # Skip memory_size info
-        if offset + 9 > len(pHeader):
-            raise ValueError("Invalid LOF file (truncated memory size info).")
-        memory_size = struct.unpack("<Q", pHeader[offset + 1 : offset + 9])[0]
-        offset += 9
+        memory_size = _read_lof_memory_header(f, lof_file_path)
+        data_position = f.tell()
 
         # Advance file pointer by memory_size
         f.seek(memory_size, os.SEEK_CUR)
@@ -115,13 +86,15 @@ def read_leica_lof(lof_file_path, include_xmlelement=False):
         xml_text = xml_bytes.decode("utf-16")
 
     # Parse the XML
-    xml_root = ET.fromstring(xml_text)
+    xml_root = xml_fromstring(xml_text)
 
     # Parse the image metadata (parse_image_xml returns a dict)
-    metadata = parse_image_xml(xml_root)
+    metadata = parse_image_xml(xml_root, columnar=columnar, profile=profile)
 
     metadata["filetype"] = ".lof"
     metadata["LOFFilePath"] = lof_file_path
+    metadata["Position"] = data_position
+    metadata["MemorySize"] = memory_size
     lp = (
         len(lof_file_path)
         + text_length
@@ -137,4 +110,77 @@ def read_leica_lof(lof_file_path, include_xmlelement=False):
     if include_xmlelement:
         metadata["xmlElement"] = xml_text
 
-    return json.dumps(metadata, indent=2)
+    return metadata
+
+
+def read_lof_data_offset(lof_file_path):
+    """
+    Resolve where the pixel data of a Leica LOF file lives.
+
+    :param lof_file_path: Path to the .lof file.
+    :return: (offset, size) in bytes of the image memory block.
+    """
+    with open(lof_file_path, "rb") as f:
+        memory_size = _read_lof_memory_header(f, lof_file_path)
+        return f.tell(), memory_size
+
+
+def _read_lof_memory_header(f, lof_file_path):
+    """
+    Read the first SNextBlock of a LOF file, leaving the file positioned at
+    the start of the image memory block.
+
+    :return: The size in bytes of the image memory block.
+    """
+    testvalue_bytes = f.read(4)
+    if len(testvalue_bytes) < 4:
+        raise ValueError(f"Error reading LOF file (first 4 bytes): {lof_file_path}")
+    testvalue = struct.unpack("<i", testvalue_bytes)[0]
+    if testvalue != 0x70:
+        raise ValueError(
+            f"Invalid LOF file format (expected 0x70): {lof_file_path}"
+        )
+
+    length_bytes = f.read(4)
+    if len(length_bytes) < 4:
+        raise ValueError(f"Error reading LOF file (length field): {lof_file_path}")
+    length = struct.unpack("<i", length_bytes)[0]
+
+    pHeader = f.read(length)
+    if len(pHeader) < length:
+        raise ValueError(
+            f"Error reading LOF file (pHeader too short): {lof_file_path}"
+        )
+
+    # The first byte should be 0x2A
+    test = struct.unpack("<B", pHeader[:1])[0]
+    if test != 0x2A:
+        raise ValueError(
+            f"Invalid LOF file format (first block not 0x2A): {lof_file_path}"
+        )
+
+    # Skip the first XML chunk we don't usually need
+    text_length = struct.unpack("<i", pHeader[1:5])[0]
+    offset = 5 + text_length * 2
+    if offset > len(pHeader):
+        raise ValueError(
+            f"Error reading LOF file (xml_bytes_header too short): {lof_file_path}"
+        )
+
+    # Skip major version info
+    if offset + 5 > len(pHeader):
+        raise ValueError("Invalid LOF file (truncated major version info).")
+    offset += 5
+
+    # Skip minor version info
+    if offset + 5 > len(pHeader):
+        raise ValueError("Invalid LOF file (truncated minor version info).")
+    offset += 5
+
+    # Skip memory_size info
+    if offset + 9 > len(pHeader):
+        raise ValueError("Invalid LOF file (truncated memory size info).")
+    memory_size = struct.unpack("<Q", pHeader[offset + 1 : offset + 9])[0]
+    offset += 9
+
+    return memory_size
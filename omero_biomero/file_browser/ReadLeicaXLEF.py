@@ -1,34 +1,231 @@
 import os
+import re
 import json
+import codecs
+import logging
+import threading
 import xml.etree.ElementTree as ET
 from urllib.parse import unquote
-from collections import deque
-from .ParseLeicaImageXML import parse_image_xml
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from .ParseLeicaImageXML import apply_tile_layout, parse_image_xml
+from .LeicaIndexCache import file_fingerprint, load_index, save_index
+from .LeicaXMLBackend import (
+    PARSE_ERRORS,
+    find_element_by_uuid,
+    xml_fromstring,
+    xml_parse,
+    xml_pull_parser,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# Parsed XML roots shared by parse_file_minimal, parse_top_level and
+# get_element_metadata, keyed by normalized path and validated by mtime.
+# Bounded by the total size of the source files.
+XML_CACHE_MAX_BYTES = 64 * 1024 * 1024
+_xml_cache = OrderedDict()
+_xml_cache_bytes = 0
+_xml_cache_lock = threading.Lock()
+
+# get_element_metadata results, keyed by normalized path and target UUID and
+# validated by size and mtime, so listing a folder again does not reopen its
+# child files (collection files without an ImageDescription would otherwise
+# be parsed in full every time). Bounded by the number of entries.
+ELEMENT_METADATA_CACHE_MAX_ITEMS = 16384
+_element_metadata_cache = OrderedDict()
+
+
+def parse_xml_cached(file_path):
+    """
+    Parse an XML file and return its root element, reusing the previously
+    parsed root as long as the file's mtime has not changed. The returned
+    tree is shared and must not be modified. Raises like xml_parse.
+    """
+    global _xml_cache_bytes
+
+    root = get_cached_xml(file_path)
+    if root is not None:
+        return root
+
+    key = os.path.normcase(os.path.normpath(file_path))
+    stat = os.stat(file_path)
+    root = xml_parse(file_path)
+
+    with _xml_cache_lock:
+        previous = _xml_cache.pop(key, None)
+        if previous is not None:
+            _xml_cache_bytes -= previous[1]
+        _xml_cache[key] = (stat.st_mtime_ns, stat.st_size, root)
+        _xml_cache_bytes += stat.st_size
+        while _xml_cache_bytes > XML_CACHE_MAX_BYTES and len(_xml_cache) > 1:
+            _, (_, size, _) = _xml_cache.popitem(last=False)
+            _xml_cache_bytes -= size
 
+    return root
 
-def read_leica_xlef(file_path, folder_uuid=None):
+
+def get_cached_xml(file_path):
+    """
+    Return the cached root element of file_path if the file has not changed
+    since it was parsed, or None (nothing is parsed).
+    """
+    key = os.path.normcase(os.path.normpath(file_path))
+    try:
+        mtime = os.stat(file_path).st_mtime_ns
+    except OSError:
+        return None
+    with _xml_cache_lock:
+        cached = _xml_cache.get(key)
+        if cached is not None and cached[0] == mtime:
+            _xml_cache.move_to_end(key)
+            return cached[2]
+    return None
+
+
+def read_leica_xlef(file_path, *args, **kwargs):
+    """
+    Reads a Leica XLEF/.xlcf/.xlif file, see read_leica_xlef_dict.
+
+    Returns a JSON string containing the resulting dictionary.
+    """
+    return json.dumps(read_leica_xlef_dict(file_path, *args, **kwargs), indent=2)
+
+
+def read_leica_xlef_dict(
+    file_path,
+    folder_uuid=None,
+    max_workers=None,
+    timeout=None,
+    columnar=False,
+    profile="full",
+):
     """
     Reads a Leica XLEF/.xlcf/.xlif file and attempts to:
       - Return the entire top-level structure if no folder_uuid is specified, or
       - Locate the requested folder_uuid in this file (and its references)
-        using a BFS approach.
+        through the project's UUID index (see get_xlef_index).
 
-    Returns a JSON string containing the resulting dictionary.
+    With max_workers > 1 the metadata of the listed children is read by a
+    thread pool of that size; timeout (seconds) bounds the wait for each
+    child file (see _build_children_list).
+
+    With columnar=True tile positions are returned as parallel lists (see
+    parse_image_xml) instead of one dictionary per tile. profile selects how
+    much metadata is parsed when folder_uuid resolves to an image (.xlif);
+    listed children always carry the listing metadata of get_element_metadata.
+
+    Returns the resulting dictionary.
     """
     file_path = os.path.normpath(file_path)
 
     if folder_uuid is None:
-        result_dict = parse_top_level(file_path)
+        result_dict = parse_top_level(file_path, max_workers, timeout)
     else:
-        result_dict = bfs_find_uuid(file_path, folder_uuid)
+        result_dict = find_uuid(file_path, folder_uuid, max_workers, timeout, profile)
 
     if result_dict is None:
         result_dict = {}
 
-    return json.dumps(result_dict, indent=2)
+    return apply_tile_layout(result_dict, columnar)
+
+
+def find_uuid(top_file, folder_uuid, max_workers=None, timeout=None, profile="full"):
+    """
+    Resolve folder_uuid with a single lookup in the project's UUID index and
+    build its tree. Falls back to bfs_find_uuid if the indexed file no longer
+    holds that UUID.
+    """
+    if not os.path.exists(top_file):
+        return None
+
+    entry = get_xlef_index(top_file)["entries"].get(folder_uuid)
+    if entry is None:
+        return None
+
+    el, _ = parse_file_minimal(entry["file"])
+    if el is None or el.get("UniqueID") != folder_uuid:
+        return bfs_find_uuid(top_file, folder_uuid, max_workers, timeout, profile)
+
+    return build_tree_for_element(
+        entry["ext"], el, entry["file"], top_file, max_workers, timeout, profile
+    )
+
+
+def get_xlef_index(top_file):
+    """
+    Return the UUID index of the project rooted at top_file, building it if
+    there is no cached index or if any of its .xlef/.xlcf files changed.
+    """
+    fingerprint = file_fingerprint(top_file)
+    index = load_index("xlef", top_file, fingerprint)
+    if index is not None and _xlef_index_is_current(index):
+        return index
+
+    index = build_xlef_index(top_file)
+    save_index("xlef", top_file, fingerprint, index)
+    return index
 
 
-def bfs_find_uuid(top_file, folder_uuid):
+def _xlef_index_is_current(index):
+    for path, mtime in index["mtimes"].items():
+        try:
+            if os.stat(path).st_mtime_ns != mtime:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def build_xlef_index(top_file):
+    """
+    Walk the project rooted at top_file (breadth-first, like bfs_find_uuid)
+    and map every UniqueID to the file that holds it:
+      - entries: UUID -> {"file": ..., "ext": ..., "parent": parent UUID}
+      - mtimes: mtime of every .xlef/.xlcf file that was parsed
+
+    Only collections are parsed: an .xlif is indexed under the UUID of the
+    Reference pointing to it, as it holds no further references.
+    """
+    entries = {}
+    mtimes = {}
+    visited = set()
+    queue = deque([(top_file, None, None)])
+
+    while queue:
+        current_file, ref_uuid, parent_uuid = queue.popleft()
+        if not os.path.exists(current_file) or current_file in visited:
+            continue
+        visited.add(current_file)
+
+        ext = current_file.lower().split(".")[-1]
+        if ext == "xlif" and ref_uuid:
+            entries.setdefault(
+                ref_uuid, {"file": current_file, "ext": ext, "parent": parent_uuid}
+            )
+            continue
+
+        mtimes[current_file] = os.stat(current_file).st_mtime_ns
+        el, refs = parse_file_minimal(current_file)
+        if el is None:
+            continue
+
+        actual_uuid = el.get("UniqueID")
+        if actual_uuid:
+            entries.setdefault(
+                actual_uuid, {"file": current_file, "ext": ext, "parent": parent_uuid}
+            )
+
+        for rfile, ruuid, rext in refs:
+            queue.append((rfile, ruuid, actual_uuid))
+
+    return {"entries": entries, "mtimes": mtimes}
+
+
+def bfs_find_uuid(
+    top_file, folder_uuid, max_workers=None, timeout=None, profile="full"
+):
     if not os.path.exists(top_file):
         return None
 
@@ -42,7 +239,9 @@ def bfs_find_uuid(top_file, folder_uuid):
 
     top_uuid = top_element.get("UniqueID") or ""
     if folder_uuid and top_uuid == folder_uuid:
-        return build_tree_for_element(top_ext, top_element, top_file, top_file)
+        return build_tree_for_element(
+            top_ext, top_element, top_file, top_file, max_workers, timeout, profile
+        )
 
     visited.add(top_file)
     for ref_file, ref_uuid, ref_ext in top_refs:
@@ -60,7 +259,9 @@ def bfs_find_uuid(top_file, folder_uuid):
 
         actual_uuid = el.get("UniqueID")
         if actual_uuid == folder_uuid:
-            return build_tree_for_element(current_ext, el, current_file, top_file)
+            return build_tree_for_element(
+                current_ext, el, current_file, top_file, max_workers, timeout, profile
+            )
 
         for rfile, ruuid, rext in refs:
             queue.append((rfile, ruuid, rext))
@@ -70,8 +271,7 @@ def bfs_find_uuid(top_file, folder_uuid):
 
 def parse_file_minimal(file_path):
     try:
-        tree = ET.parse(file_path)
-        root = tree.getroot()
+        root = parse_xml_cached(file_path)
     except Exception:
         return None, []
 
@@ -90,9 +290,11 @@ def parse_file_minimal(file_path):
     return main_el, refs
 
 
-def build_tree_for_element(ext, element, file_path, top_file):
+def build_tree_for_element(
+    ext, element, file_path, top_file, max_workers=None, timeout=None, profile="full"
+):
     if ext == "xlif":
-        metadata = parse_image_xml(element)
+        metadata = parse_image_xml(element, profile=profile)
         metadata["XLIFFile"] = file_path
 
         lof_rel = metadata.get("LOFFile")
@@ -106,18 +308,19 @@ def build_tree_for_element(ext, element, file_path, top_file):
             "type": "Folder",
             "name": element.get("Name", ""),
             "uuid": element.get("UniqueID"),
-            "children": _build_children_list(element, file_path, top_file),
+            "children": _build_children_list(
+                element, file_path, top_file, max_workers, timeout
+            ),
         }
 
 
-def parse_top_level(file_path):
+def parse_top_level(file_path, max_workers=None, timeout=None):
     if not os.path.exists(file_path):
         return None
 
     extension = file_path.lower().split(".")[-1]
     try:
-        tree = ET.parse(file_path)
-        root = tree.getroot()
+        root = parse_xml_cached(file_path)
     except Exception:
         return None
 
@@ -129,11 +332,24 @@ def parse_top_level(file_path):
         "type": "File" if extension in ["xlef", "xlcf"] else "Unknown",
         "name": top_el.get("Name", ""),
         "uuid": top_el.get("UniqueID"),
-        "children": _build_children_list(top_el, file_path, file_path),
+        "children": _build_children_list(
+            top_el, file_path, file_path, max_workers, timeout
+        ),
     }
 
 
-def _build_children_list(element, base_file, top_file):
+def _build_children_list(
+    element, base_file, top_file, max_workers=None, timeout=None
+):
+    """
+    List the referenced children of a collection element, in reference order.
+
+    The child files are read serially by default. With max_workers > 1 they
+    are fetched and parsed by a bounded thread pool, which pays off on
+    latency-bound network shares. A child whose metadata is not available
+    within timeout seconds (once the listing waits for it) is listed with
+    default metadata instead of blocking the listing.
+    """
     children_list = []
     child_elem = element.find("Children")
     if child_elem is None:
@@ -142,10 +358,16 @@ def _build_children_list(element, base_file, top_file):
     xlef_base_name = os.path.splitext(os.path.basename(top_file))[0]
     xlef_folder = os.path.dirname(top_file)
 
+    refs = []
     for ref in child_elem.findall("Reference"):
         ref_file = unquote(ref.get("File") or "")
         ref_file = os.path.normpath(os.path.join(os.path.dirname(base_file), ref_file))
         ref_uuid = ref.get("UUID") or ""
+        refs.append((ref_file, ref_uuid))
+
+    for (ref_file, ref_uuid), metadata in zip(
+        refs, _get_children_metadata(refs, max_workers, timeout)
+    ):
         ext = ref_file.lower().split(".")[-1]
 
         ctype = (
@@ -154,7 +376,6 @@ def _build_children_list(element, base_file, top_file):
             else "Image" if ext == "xlif" else "File" if ext == "xlef" else "Unknown"
         )
 
-        metadata = get_element_metadata(ref_file, ref_uuid)
         real_child_name = metadata["ElementName"]
 
         lof_rel = metadata.get("LOFFile")
@@ -199,6 +420,52 @@ def _build_children_list(element, base_file, top_file):
     return children_list
 
 
+def _get_children_metadata(refs, max_workers=None, timeout=None):
+    """
+    get_element_metadata for every (file, uuid) in refs, in the same order.
+    """
+    if not max_workers or max_workers <= 1 or len(refs) <= 1:
+        return [
+            get_element_metadata(ref_file, ref_uuid) for ref_file, ref_uuid in refs
+        ]
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(refs)))
+    futures = []
+    try:
+        futures = [
+            executor.submit(get_element_metadata, ref_file, ref_uuid)
+            for ref_file, ref_uuid in refs
+        ]
+        results = []
+        for (ref_file, _), future in zip(refs, futures):
+            try:
+                results.append(future.result(timeout=timeout))
+            except TimeoutError:
+                logger.warning(f"Timed out reading metadata of {ref_file}")
+                results.append(_default_element_metadata())
+        return results
+    finally:
+        # Do not wait for stalled files, and drop work that has not started
+        # (shutdown's cancel_futures needs Python 3.9)
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def _default_element_metadata():
+    return {
+        "ElementName": "Unnamed",
+        "LOFFile": None,
+        "xs": 1,
+        "ys": 1,
+        "zs": 1,
+        "ts": 1,
+        "tiles": 1,
+        "channels": 1,
+        "isrgb": False,
+    }
+
+
 def _build_children_list_old(element, base_file, top_file):
     children_list = []
     child_elem = element.find("Children")
@@ -244,49 +511,59 @@ def _build_children_list_old(element, base_file, top_file):
 
 
 def get_element_metadata(file_path, target_uuid=None):
-    if not os.path.exists(file_path):
-        return {
-            "ElementName": "Unnamed",
-            "LOFFile": None,
-            "xs": 1,
-            "ys": 1,
-            "zs": 1,
-            "ts": 1,
-            "tiles": 1,
-            "channels": 1,
-            "isrgb": False,
-        }
+    """
+    Name, LOF file, dimensions and channel count of an .xlif/.xlcf element.
+
+    A file that is already in the parsed-element cache is read from there.
+    Otherwise the fields are taken from _fast_element_metadata, which stops
+    reading once ImageDescription is complete, and the file is only parsed
+    in full when that fast path cannot find every field.
 
+    Results are cached per file and target_uuid until the file's size or
+    mtime changes; every call returns a new dictionary.
+    """
     try:
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-    except Exception:
-        return {
-            "ElementName": "Unnamed",
-            "LOFFile": None,
-            "xs": 1,
-            "ys": 1,
-            "zs": 1,
-            "ts": 1,
-            "tiles": 1,
-            "channels": 1,
-            "isrgb": False,
-        }
+        stat = os.stat(file_path)
+    except OSError:
+        return _default_element_metadata()
+
+    key = (os.path.normcase(os.path.normpath(file_path)), target_uuid)
+    fingerprint = (stat.st_size, stat.st_mtime_ns)
+    with _xml_cache_lock:
+        cached = _element_metadata_cache.get(key)
+        if cached is not None and cached[0] == fingerprint:
+            _element_metadata_cache.move_to_end(key)
+            return dict(cached[1])
+
+    metadata = _read_element_metadata(file_path, target_uuid)
+
+    with _xml_cache_lock:
+        _element_metadata_cache[key] = (fingerprint, dict(metadata))
+        _element_metadata_cache.move_to_end(key)
+        while len(_element_metadata_cache) > ELEMENT_METADATA_CACHE_MAX_ITEMS:
+            _element_metadata_cache.popitem(last=False)
+    return metadata
 
-    metadata = {
-        "ElementName": "Unnamed",
-        "LOFFile": None,
-        "xs": 1,
-        "ys": 1,
-        "zs": 1,
-        "ts": 1,
-        "tiles": 1,
-        "channels": 1,
-        "isrgb": False,
-    }
+
+def _read_element_metadata(file_path, target_uuid=None):
+    root = get_cached_xml(file_path)
+    if root is None:
+        try:
+            metadata = _fast_element_metadata(file_path, target_uuid)
+        except Exception:
+            metadata = None
+        if metadata is not None:
+            return metadata
+
+        try:
+            root = parse_xml_cached(file_path)
+        except Exception:
+            return _default_element_metadata()
+
+    metadata = _default_element_metadata()
 
     element = (
-        root.find(f".//Element[@UniqueID='{target_uuid}']")
+        find_element_by_uuid(root, target_uuid)
         if target_uuid
         else root.find(".//Element")
     )
@@ -295,41 +572,158 @@ def get_element_metadata(file_path, target_uuid=None):
 
     memory_block = root.find(".//Memory/Block")
     if memory_block is not None:
-        block_file = memory_block.attrib.get("File")
-        if block_file and block_file.lower().endswith(".lof"):
-            metadata["LOFFile"] = block_file
+        _read_memory_block(memory_block, metadata)
 
     image_description = root.find(".//ImageDescription")
     if image_description is not None:
-        dimensions_element = image_description.find("Dimensions")
-        if dimensions_element is not None:
-            dim_descriptions = dimensions_element.findall("DimensionDescription")
-            for dim_desc in dim_descriptions:
-                dim_id = int(dim_desc.attrib.get("DimID", "0"))
-                num_elements = int(dim_desc.attrib.get("NumberOfElements", "1"))
-                if dim_id == 1:
-                    metadata["xs"] = num_elements
-                elif dim_id == 2:
-                    metadata["ys"] = num_elements
-                elif dim_id == 3:
-                    metadata["zs"] = num_elements
-                elif dim_id == 4:
-                    metadata["ts"] = num_elements
-                elif dim_id == 10:
-                    metadata["tiles"] = num_elements
-
-        channels_element = image_description.find("Channels")
-        if channels_element is not None:
-            channel_descriptions = channels_element.findall("ChannelDescription")
-            metadata["channels"] = len(channel_descriptions)
-            if metadata["channels"] > 1:
-                channel_tag = channel_descriptions[0].attrib.get("ChannelTag")
-                if channel_tag and int(channel_tag) != 0:
-                    metadata["isrgb"] = True
+        _read_image_description(image_description, metadata)
+
+    return metadata
+
+
+def _read_memory_block(memory_block, metadata):
+    block_file = memory_block.attrib.get("File")
+    if block_file and block_file.lower().endswith(".lof"):
+        metadata["LOFFile"] = block_file
+
+
+def _read_image_description(image_description, metadata):
+    dimensions_element = image_description.find("Dimensions")
+    if dimensions_element is not None:
+        dim_descriptions = dimensions_element.findall("DimensionDescription")
+        for dim_desc in dim_descriptions:
+            dim_id = int(dim_desc.attrib.get("DimID", "0"))
+            num_elements = int(dim_desc.attrib.get("NumberOfElements", "1"))
+            if dim_id == 1:
+                metadata["xs"] = num_elements
+            elif dim_id == 2:
+                metadata["ys"] = num_elements
+            elif dim_id == 3:
+                metadata["zs"] = num_elements
+            elif dim_id == 4:
+                metadata["ts"] = num_elements
+            elif dim_id == 10:
+                metadata["tiles"] = num_elements
+
+    channels_element = image_description.find("Channels")
+    if channels_element is not None:
+        channel_descriptions = channels_element.findall("ChannelDescription")
+        metadata["channels"] = len(channel_descriptions)
+        if metadata["channels"] > 1:
+            channel_tag = channel_descriptions[0].attrib.get("ChannelTag")
+            if channel_tag and int(channel_tag) != 0:
+                metadata["isrgb"] = True
+
+
+# Size of the chunks fed to the incremental parser, and of the file tail that
+# is searched for the Memory element once ImageDescription has been read.
+FAST_METADATA_CHUNK_SIZE = 64 * 1024
+FAST_METADATA_TAIL_SIZE = 64 * 1024
+
+
+def _fast_element_metadata(file_path, target_uuid=None):
+    """
+    Extract the get_element_metadata fields without parsing the whole file.
+
+    The file is fed to an incremental parser until the first ImageDescription
+    is complete, so the Attachment sections that follow it (hardware
+    settings, tile scan info, ...) are never read. In .xlif files the Memory
+    element comes after those attachments, so it is parsed on its own from
+    the tail of the file.
+
+    Returns None when a field could not be found this way; the caller then
+    falls back to a full parse.
+    """
+    metadata = _default_element_metadata()
+    parser = xml_pull_parser(events=("start", "end"))
+    open_tags = []
+    name_found = False
+    block_found = False
+    description_found = False
+
+    with open(file_path, "rb") as f:
+        head = f.read(FAST_METADATA_CHUNK_SIZE)
+        chunk = head
+        while not description_found:
+            if chunk:
+                parser.feed(chunk)
+            else:
+                parser.close()
+
+            # open_tags holds the ancestors of the current element; like the
+            # ".//" searches of the full parse, the root itself never matches
+            for event, element in parser.read_events():
+                if event == "start":
+                    if element.tag == "Element" and open_tags and not name_found:
+                        if target_uuid in (None, element.get("UniqueID")):
+                            metadata["ElementName"] = element.get("Name", "Unnamed")
+                            name_found = True
+                    open_tags.append(element.tag)
+                    continue
+
+                open_tags.pop()
+                if (
+                    element.tag == "Block"
+                    and len(open_tags) >= 2
+                    and open_tags[-1] == "Memory"
+                    and not block_found
+                ):
+                    _read_memory_block(element, metadata)
+                    block_found = True
+                elif element.tag == "ImageDescription" and open_tags:
+                    _read_image_description(element, metadata)
+                    description_found = True
+                    break
+
+            if not chunk:
+                # The whole file was parsed, so every field is final
+                return metadata
+            if not description_found:
+                chunk = f.read(FAST_METADATA_CHUNK_SIZE)
+
+        if not name_found:
+            return None
+
+        if not block_found:
+            # Only search the raw tail of files in an ASCII-compatible encoding
+            declaration = re.match(rb"<\?xml[^>]*encoding=[\"']([\w-]+)", head)
+            if not head.startswith((b"<", codecs.BOM_UTF8)) or (
+                declaration is not None
+                and declaration.group(1).lower() not in (b"utf-8", b"us-ascii")
+            ):
+                return None
+
+            file_size = os.fstat(f.fileno()).st_size
+            f.seek(max(file_size - FAST_METADATA_TAIL_SIZE, 0))
+            memory_block = _find_memory_block(f.read())
+            if memory_block is None:
+                return None
+            _read_memory_block(memory_block, metadata)
 
     return metadata
 
 
+def _find_memory_block(tail):
+    """
+    Find the first Memory element with a Block child in a chunk of raw XML.
+    """
+    start = tail.find(b"<Memory")
+    while start != -1:
+        end = tail.find(b"</Memory>", start)
+        if end == -1:
+            return None
+        try:
+            memory_block = xml_fromstring(tail[start : end + len(b"</Memory>")]).find(
+                "Block"
+            )
+        except PARSE_ERRORS:
+            memory_block = None
+        if memory_block is not None:
+            return memory_block
+        start = tail.find(b"<Memory", start + 1)
+    return None
+
+
 def get_element_metadata_old(file_path, target_uuid=None):
     if not os.path.exists(file_path):
         return {"ElementName": "Unnamed", "LOFFile": None}
@@ -34,6 +34,10 @@ urlpatterns = [
          views.get_folder_contents,
          name="get_folder_contents",
          ),
+    path("get_preview/",
+         views.get_preview,
+         name="get_preview",
+         ),
     path("biomero/",
          views.biomero,
          name="biomero",
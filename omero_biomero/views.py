@@ -2,7 +2,12 @@
 # -*- coding: utf-8 -*-
 from collections import defaultdict
 from uuid import uuid4
-from django.http import JsonResponse, HttpResponseBadRequest, HttpResponse
+from django.http import (
+    JsonResponse,
+    HttpResponseBadRequest,
+    HttpResponse,
+    HttpResponseNotFound,
+)
 import os
 import time
 import json
@@ -12,6 +17,7 @@ import datetime
 from django.shortcuts import render
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.conf import settings
 from omeroweb.webclient.decorators import login_required, render_response
 from omero.gateway import BlitzGateway
@@ -24,8 +30,20 @@ import datetime
 import uuid
 from collections import defaultdict
 from omero_adi.utils.ingest_tracker import initialize_ingest_tracker
-from .constants import BROWSABLE_FILE_EXTENSIONS, SUPPORTED_FILE_EXTENSIONS
-from .file_browser.ReadLeicaFile import read_leica_file
+from .constants import (
+    BROWSABLE_FILE_EXTENSIONS,
+    PREVIEW_FILE_EXTENSIONS,
+    SUPPORTED_FILE_EXTENSIONS,
+)
+from .file_browser.ReadLeicaFile import read_leica_file_dict
+from .file_browser.ParseLeicaImageXML import METADATA_PROFILES
+from .file_browser.PreviewPrefetch import PrefetchJob, get_preview_prefetcher
+from .file_browser.PreviewCache import (
+    PREVIEW_FORMATS,
+    get_preview_cache_folder,
+    preview_etag,
+    preview_format,
+)
 from .utils import parse_bool_env
 
 logger = logging.getLogger(__name__)
@@ -864,6 +882,12 @@ def biomero(request, conn=None, **kwargs):
     return context
 
 
+# Largest preview height get_preview renders
+MAX_PREVIEW_HEIGHT = 2048
+# How long browsers may reuse a preview before revalidating it (seconds)
+PREVIEW_MAX_AGE = 3600
+
+
 @login_required()
 @render_response()
 @require_http_methods(["GET"])
@@ -878,6 +902,32 @@ def get_folder_contents(request, conn=None, **kwargs):
     # Extract the folder ID from the request
     item_id = request.GET.get("item_id", None)
     is_folder = request.GET.get("is_folder", False)
+    # Tile positions are sent as parallel lists unless the client asks for
+    # the per-tile dictionaries with tile_layout=records
+    columnar = request.GET.get("tile_layout", "columnar") != "records"
+    # Metadata profile of a single image: listing, preview or full
+    profile = request.GET.get("profile", "full")
+    if profile not in METADATA_PROFILES:
+        return HttpResponseBadRequest(f"Unknown metadata profile: {profile}")
+    # Optionally render the previews of the listed images in the background,
+    # the first visible_items of them first
+    prefetch_previews = parse_bool_env(
+        request.GET.get("prefetch_previews"), default=False
+    )
+    if prefetch_previews:
+        try:
+            preview_height = int(request.GET.get("preview_height", 256))
+            visible_items = int(request.GET.get("visible_items", 50))
+            preview_image_format, preview_quality = preview_format(
+                request.GET.get("preview_format", "png"),
+                request.GET.get("preview_quality"),
+            )
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+        if not 1 <= preview_height <= MAX_PREVIEW_HEIGHT:
+            return HttpResponseBadRequest(
+                f"preview_height must be between 1 and {MAX_PREVIEW_HEIGHT}."
+            )
 
     # Split the item ID to get the folder ID and item UUID
     item_uuid = None
@@ -905,14 +955,25 @@ def get_folder_contents(request, conn=None, **kwargs):
         ext = os.path.splitext(target_path)[1]
         if ext in BROWSABLE_FILE_EXTENSIONS:
 
+            # Plain dictionaries, serialized once with the response
             if is_folder:
-                metadata = read_leica_file(target_path, folder_uuid=item_uuid)
+                clicked_item_metadata = read_leica_file_dict(
+                    target_path,
+                    folder_uuid=item_uuid,
+                    profile="listing",
+                    columnar=columnar,
+                )
             elif item_uuid:
-                metadata = read_leica_file(target_path, image_uuid=item_uuid)
+                clicked_item_metadata = read_leica_file_dict(
+                    target_path,
+                    image_uuid=item_uuid,
+                    profile=profile,
+                    columnar=columnar,
+                )
             else:
-                metadata = read_leica_file(target_path)
-
-            clicked_item_metadata = json.loads(metadata)
+                clicked_item_metadata = read_leica_file_dict(
+                    target_path, profile="listing", columnar=columnar
+                )
 
             for item in clicked_item_metadata["children"]:
                 item_type = item.get("type", None)
@@ -987,7 +1048,9 @@ def get_folder_contents(request, conn=None, **kwargs):
                     metadata = None
                     if ext in BROWSABLE_FILE_EXTENSIONS:
                         # Read metadata for Leica files
-                        metadata = read_leica_file(item_path)
+                        metadata = read_leica_file_dict(
+                            item_path, profile="listing", columnar=columnar
+                        )
 
                     # .zarr folders should be treated as files
                     is_folder = (
@@ -1010,9 +1073,160 @@ def get_folder_contents(request, conn=None, **kwargs):
     # Sort the contents by name, folders first
     contents.sort(key=lambda x: (not x["is_folder"], x["name"].lower()))
 
+    # Only the listing of a folder or Leica file that says whether to prefetch
+    # replaces the session's batch, so navigating away cancels previews that
+    # are not needed. Metadata requests for one item, and listings without
+    # prefetch_previews (e.g. expanding another node of a tree), leave the
+    # batch of the folder being viewed alone.
+    session = conn.getEventContext().sessionUuid
+    is_listing = os.path.isdir(target_path) or (
+        os.path.splitext(target_path)[1] in BROWSABLE_FILE_EXTENSIONS
+        and (is_folder or not item_uuid)
+    )
+    if is_listing and prefetch_previews:
+        images = [
+            item
+            for item in contents
+            if item["metadata"] and item["metadata"].get("datatype") == "Image"
+        ]
+        jobs = [
+            (
+                0 if i < visible_items else 1,
+                PrefetchJob(
+                    target_path,
+                    item["metadata"]["uuid"],
+                    preview_height,
+                    preview_image_format,
+                    preview_quality,
+                ),
+            )
+            for i, item in enumerate(images)
+        ]
+        get_preview_prefetcher().schedule(session, jobs)
+    elif is_listing and "prefetch_previews" in request.GET:
+        get_preview_prefetcher().cancel(session)
+
     return {"contents": contents, "item_id": item_id, "metadata": clicked_item_metadata}
 
 
+@login_required()
+@require_http_methods(["GET"])
+def get_preview(request, conn=None, **kwargs):
+    """
+    Serve the preview of a Leica image, given its item_id (path#uuid, as
+    listed by get_folder_contents), height (default 256, capped at the height
+    of the image), format (png, webp or jpeg, default png) and, for webp and
+    jpeg, quality (1-100).
+    projection=mip shows the maximum intensity projection of the Z stack
+    instead of the center plane, reading every z_step-th plane.
+    tile_mode=mosaic shows all tiles of a tile scan at their field positions
+    instead of the center tile.
+
+    Responses carry a strong ETag derived from the file fingerprint and a
+    private Cache-Control header; revalidation with a matching If-None-Match
+    is answered with 304 without reading the file.
+
+    Rendering needs numpy and OpenCV (the "previews" extra); without them
+    the other endpoints keep working and this one answers 501.
+    """
+    try:
+        from .file_browser.CreatePreview import (
+            PROJECTION_MODES,
+            TILE_MODES,
+            get_cached_preview_bytes,
+        )
+    except ImportError as e:
+        logger.error(f"Leica previews are not available: {e}")
+        return HttpResponse("Previews are not available on this server.", status=501)
+
+    base_dir = os.path.realpath(os.getenv("IMPORT_MOUNT_PATH", "/L-Drive"))
+
+    item_id = request.GET.get("item_id", "")
+    item_path, _, item_uuid = item_id.partition("#")
+    if not item_path or not item_uuid:
+        return HttpResponseBadRequest("item_id must be of the form path#uuid.")
+
+    try:
+        height = int(request.GET.get("height", 256))
+    except ValueError:
+        return HttpResponseBadRequest("height must be an integer.")
+    if not 1 <= height <= MAX_PREVIEW_HEIGHT:
+        return HttpResponseBadRequest(
+            f"height must be between 1 and {MAX_PREVIEW_HEIGHT}."
+        )
+    try:
+        image_format, quality = preview_format(
+            request.GET.get("format", "png"), request.GET.get("quality")
+        )
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    projection = request.GET.get("projection", "center")
+    if projection not in PROJECTION_MODES:
+        return HttpResponseBadRequest(f"Unknown projection mode: {projection}")
+    z_step = None
+    if projection == "mip" and request.GET.get("z_step"):
+        try:
+            z_step = int(request.GET["z_step"])
+        except ValueError:
+            return HttpResponseBadRequest("z_step must be an integer.")
+        if z_step < 1:
+            return HttpResponseBadRequest("z_step must be at least 1.")
+    tile_mode = request.GET.get("tile_mode", "center")
+    if tile_mode not in TILE_MODES:
+        return HttpResponseBadRequest(f"Unknown tile mode: {tile_mode}")
+
+    # Resolve symlinks and '..' so the path cannot leave the mount
+    target_path = os.path.realpath(os.path.join(base_dir, item_path))
+    if os.path.commonpath([target_path, base_dir]) != base_dir:
+        return HttpResponseBadRequest("Invalid path.")
+    if (
+        not os.path.isfile(target_path)
+        or os.path.splitext(target_path)[1] not in PREVIEW_FILE_EXTENSIONS
+    ):
+        return HttpResponseBadRequest("Invalid file ID or path does not exist.")
+
+    etag = preview_etag(
+        target_path,
+        item_uuid,
+        height,
+        format=image_format,
+        quality=quality,
+        projection=projection,
+        z_step=z_step,
+        tile_mode=tile_mode,
+    )
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        try:
+            metadata = read_leica_file_dict(
+                target_path, image_uuid=item_uuid, profile="preview"
+            )
+        except ValueError as e:
+            return HttpResponseNotFound(str(e))
+        try:
+            data = get_cached_preview_bytes(
+                metadata,
+                get_preview_cache_folder(),
+                preview_height=height,
+                image_format=image_format,
+                quality=quality,
+                projection=projection,
+                z_step=z_step,
+                tile_mode=tile_mode,
+            )
+        except (ValueError, KeyError) as e:
+            # item_uuid names a folder, or the image lacks the metadata needed
+            # to read its pixels
+            logger.warning(f"Cannot render preview of {item_id}: {e!r}")
+            return HttpResponseBadRequest("Item cannot be previewed.")
+        response = HttpResponse(
+            data, content_type=PREVIEW_FORMATS[image_format]["mime_type"]
+        )
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, max_age=PREVIEW_MAX_AGE)
+    return response
+
+
 @login_required()
 @require_http_methods(["GET", "POST"])
 def group_mappings(request, conn=None, **kwargs):
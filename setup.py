@@ -51,6 +51,12 @@ setup(
         "configupdater>=3.2",
         "omero_adi @ git+https://github.com/Cellular-Imaging-Amsterdam-UMC/OMERO-Automated-Data-Import.git@main",
     ],
+    extras_require={
+        # Faster XML parsing for the Leica file browser
+        "lxml": ["lxml"],
+        # Previews of Leica images in the file browser
+        "previews": ["numpy", "opencv-python-headless"],
+    },
     python_requires=">=3",
     include_package_data=True,
     zip_safe=False,
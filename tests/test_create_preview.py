@@ -0,0 +1,173 @@
+import os
+import itertools
+import xml.etree.ElementTree as ET
+from unittest import mock
+
+import numpy as np
+import pytest
+
+from omero_biomero.file_browser.CreatePreview import (
+    PREVIEW_PYRAMID_HEIGHTS,
+    get_cached_preview_bytes,
+    mosaic_fields,
+    render_preview,
+    viewer_scaling_luts,
+)
+from omero_biomero.file_browser.LeicaPlaneReader import LeicaPlaneReader
+from omero_biomero.file_browser.ParseLeicaImageXML import parse_image_xml
+
+XML_FOLDER = os.path.join(os.path.dirname(__file__), "data", "leica_image_xml")
+
+
+def make_image(tmp_path, ys=2400, xs=1800, channels=2, bits=16, name="image.raw", seed=0):
+    """
+    Write random planes (channel-major, one tile, z and t) as a raw memory
+    block and return metadata that reads them like an LOF image.
+    """
+    rng = np.random.default_rng(seed)
+    dtype = np.uint8 if bits == 8 else np.uint16
+    planes = rng.integers(0, 2**bits, size=(channels, ys, xs), dtype=dtype)
+    path = tmp_path / name
+    planes.tofile(path)
+    plane_bytes = ys * xs * planes.itemsize
+    return {
+        "UniqueID": name,
+        "filetype": ".lof",
+        "LOFFilePath": str(path),
+        "Position": 0,
+        "MemorySize": planes.nbytes,
+        "xs": xs,
+        "ys": ys,
+        "channels": channels,
+        "channelResolution": [bits] * channels,
+        "channelbytesinc": [c * plane_bytes for c in range(channels)],
+        "lutname": ["green", "red", "blue"][:channels],
+        "blackvalue": [0] * channels,
+        "whitevalue": [1] * channels,
+    }
+
+
+def test_pyramid_levels_do_not_depend_on_request_order(tmp_path):
+    metadata = make_image(tmp_path)
+    results = {}
+    for n, order in enumerate(itertools.permutations(PREVIEW_PYRAMID_HEIGHTS)):
+        cache_folder = tmp_path / f"cache{n}"
+        for height in order:
+            data = get_cached_preview_bytes(metadata, str(cache_folder), preview_height=height)
+            results.setdefault(height, set()).add(data)
+    assert all(len(datas) == 1 for datas in results.values())
+
+
+def test_cache_miss_reads_the_plane_once(tmp_path):
+    metadata = make_image(tmp_path)
+    patch = mock.patch.object(
+        LeicaPlaneReader, "read_plane", autospec=True, side_effect=LeicaPlaneReader.read_plane
+    )
+    with patch as read_plane:
+        get_cached_preview_bytes(metadata, str(tmp_path / "cache"), preview_height=64)
+        assert read_plane.call_count == metadata["channels"]
+        for height in PREVIEW_PYRAMID_HEIGHTS:
+            get_cached_preview_bytes(metadata, str(tmp_path / "cache"), preview_height=height)
+        assert read_plane.call_count == metadata["channels"]
+
+
+@pytest.mark.parametrize("height", [64, 100, 1024])
+def test_uncached_render_matches_cached_level(tmp_path, height):
+    metadata = make_image(tmp_path)
+    for warm in PREVIEW_PYRAMID_HEIGHTS:
+        get_cached_preview_bytes(metadata, str(tmp_path / "cache"), preview_height=warm)
+    cached = get_cached_preview_bytes(metadata, str(tmp_path / "cache"), preview_height=height)
+    direct = get_cached_preview_bytes(metadata, str(tmp_path / f"direct{height}"), preview_height=height)
+    assert cached == direct
+    assert render_preview(metadata, height).shape[0] == height
+
+
+def test_previews_are_not_taller_than_the_image(tmp_path):
+    metadata = make_image(tmp_path, ys=200, xs=300)
+    assert render_preview(metadata, 1024).shape == (200, 300, 3)
+    assert render_preview(metadata, 64).shape == (64, 96, 3)
+
+
+def test_viewer_scaling_uses_the_channel_bit_depth():
+    # 12-bit data stored in 16 bits: a white value of 0.5 is 2047.5, not 32767.5
+    metadata = {"blackvalue": [0.0], "whitevalue": [0.5], "channelResolution": [12]}
+    (lut,) = viewer_scaling_luts(metadata, 1, 65535, np.uint16)
+    assert lut[2048] == 65535
+    assert lut[1024] == pytest.approx(65535 / 2, abs=64)
+    assert lut[0] == 0
+
+
+def test_12_bit_preview_is_not_dark(tmp_path):
+    metadata = make_image(tmp_path, ys=256, xs=256, channels=1, bits=12)
+    metadata["whitevalue"] = [0.9]
+    impreview = render_preview(metadata, 256)
+    assert impreview.max() == 65535
+    assert impreview[:, :, 1].mean() > 0.4 * 65535
+
+
+def make_tile_scan(tmp_path, flipx=0, flipy=0, swapxy=0):
+    """
+    A 2 x 1 tile scan (FieldX 0 and 1) of 8-bit single-channel 32 x 32 tiles:
+    the first tile is black, the second white.
+    """
+    tiles = np.zeros((2, 32, 32), dtype=np.uint8)
+    tiles[1] = 255
+    path = tmp_path / "tiles.raw"
+    tiles.tofile(path)
+    return {
+        "UniqueID": "tiles",
+        "filetype": ".lof",
+        "LOFFilePath": str(path),
+        "Position": 0,
+        "MemorySize": tiles.nbytes,
+        "xs": 32,
+        "ys": 32,
+        "tiles": 2,
+        "tilesbytesinc": 32 * 32,
+        "channels": 1,
+        "channelResolution": [8],
+        "channelbytesinc": [0],
+        "lutname": ["gray"],
+        "tile_positions": {
+            "FieldX": [0, 1],
+            "FieldY": [0, 0],
+            "PosX": [0.0, 1e-4],
+            "PosY": [0.0, 0.0],
+        },
+        "flipx": flipx,
+        "flipy": flipy,
+        "swapxy": swapxy,
+    }
+
+
+def test_mosaic_fields_apply_the_stage_flips():
+    metadata = {
+        "tile_positions": {"FieldX": [0, 1, 0, 1], "FieldY": [0, 0, 1, 1]},
+        "flipx": 1,
+        "flipy": 0,
+        "swapxy": 0,
+    }
+    assert mosaic_fields(metadata, 4) == [(1, 0), (0, 0), (1, 1), (0, 1)]
+    metadata.update(flipx=0, flipy=1)
+    assert mosaic_fields(metadata, 4) == [(0, 1), (1, 1), (0, 0), (1, 0)]
+    metadata.update(flipy=0, swapxy=1)
+    assert mosaic_fields(metadata, 4) == [(0, 0), (0, 1), (1, 0), (1, 1)]
+
+
+def test_mosaic_fields_of_a_parsed_flipped_tile_scan():
+    # tile_scan.xml has FlipY="1" and two rows of three fields
+    element = ET.parse(os.path.join(XML_FOLDER, "tile_scan.xml")).getroot()
+    metadata = parse_image_xml(element, columnar=True)
+    assert mosaic_fields(metadata, metadata["tiles"]) == [
+        (0, 1), (1, 1), (2, 1), (0, 0), (1, 0), (2, 0)
+    ]
+
+
+@pytest.mark.parametrize("flipx, bright_column", [(0, 1), (1, 0)])
+def test_flipped_tile_scan_mosaic(tmp_path, flipx, bright_column):
+    metadata = make_tile_scan(tmp_path, flipx=flipx)
+    impreview = render_preview(metadata, 32, contrast="percentile", tile_mode="mosaic")
+    assert impreview.shape == (32, 64, 3)
+    halves = [impreview[:, :32].mean(), impreview[:, 32:].mean()]
+    assert halves[bright_column] == 255
+    assert halves[1 - bright_column] == 0
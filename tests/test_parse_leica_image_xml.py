@@ -0,0 +1,57 @@
+import os
+import json
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from omero_biomero.file_browser.ParseLeicaImageXML import (
+    parse_image_xml,
+    tile_positions_to_records,
+)
+
+# Each fixture is an image Element (or an LOF container root) next to the
+# metadata the parser produced for it before it was restructured; the parser
+# must keep producing exactly that.
+DATA_FOLDER = os.path.join(os.path.dirname(__file__), "data", "leica_image_xml")
+FIXTURES = [
+    "confocal",
+    "camera",
+    "thunder",
+    "stellaris",
+    "lof_root",
+    "tile_scan",
+    "nested_hardware",
+]
+
+
+def load_fixture(name):
+    element = ET.parse(os.path.join(DATA_FOLDER, name + ".xml")).getroot()
+    with open(os.path.join(DATA_FOLDER, name + ".json")) as f:
+        expected = json.load(f)
+    return element, expected
+
+
+def as_json(metadata):
+    # The frozen dicts went through JSON, so tuples compare as lists
+    return json.loads(json.dumps(metadata))
+
+
+@pytest.mark.parametrize("name", FIXTURES)
+def test_parse_image_xml_matches_frozen_metadata(name):
+    element, expected = load_fixture(name)
+    assert as_json(parse_image_xml(element)) == expected
+
+
+@pytest.mark.parametrize("name", FIXTURES)
+def test_preview_profile_is_a_subset_of_full(name):
+    element, expected = load_fixture(name)
+    preview = as_json(parse_image_xml(element, profile="preview"))
+    assert "objective" not in preview
+    assert preview == {key: expected[key] for key in preview}
+
+
+def test_columnar_tile_positions_round_trip():
+    element, expected = load_fixture("tile_scan")
+    metadata = parse_image_xml(element, columnar=True)
+    metadata["tile_positions"] = tile_positions_to_records(metadata["tile_positions"])
+    assert as_json(metadata) == expected